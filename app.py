@@ -1,6 +1,10 @@
 import dash
 import dash_bootstrap_components as dbc
 
+from apps.callback_metrics import instrument_callbacks
+
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 server = app.server
 app.config.suppress_callback_exceptions = True
+# Before any page registers callbacks, so they're all timed
+callback_metrics = instrument_callbacks(app)
@@ -0,0 +1,165 @@
+"""
+Per-callback latency metrics for the Dash app. instrument_callbacks(app)
+wraps app.callback, so every callback registered after it (i.e. all the
+pages' callbacks, as app.py instruments before they're imported) records:
+    * latency histogram, total & max (errors counted separately)
+    * response payload bytes (before compression), from the Flask response
+    * which input(s) triggered each call
+Calls slower than GAMEPLAN_SLOW_CALLBACK_S (default 1s) are logged w/ their
+arguments to the 'gameplan.callbacks' logger. The stats are served as json
+at /metrics/callbacks, to local requests only by default.
+"""
+from collections import Counter
+from functools import wraps
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import dash
+import flask
+
+logger = logging.getLogger('gameplan.callbacks')
+
+# Upper bounds (seconds) of the latency histogram buckets; the last is open
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPDATE_PATH = '/_dash-update-component'
+LOCAL_ADDRS = ('127.0.0.1', '::1')
+
+
+class CallbackStats():
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.payload_calls = 0
+        self.payload_bytes = 0
+        self.max_payload_bytes = 0
+        self.triggers = Counter()
+
+    def record_call(self, elapsed: float, trigger: str, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.total_s += elapsed
+        self.max_s = max(self.max_s, elapsed)
+        bucket = sum(elapsed > x for x in LATENCY_BUCKETS)
+        self.latency_counts[bucket] += 1
+        self.triggers[trigger] += 1
+
+    def record_payload(self, n_bytes: int) -> None:
+        self.payload_calls += 1
+        self.payload_bytes += n_bytes
+        self.max_payload_bytes = max(self.max_payload_bytes, n_bytes)
+
+    def to_dict(self) -> dict:
+        return dict(
+            calls=self.calls,
+            errors=self.errors,
+            mean_s=self.total_s / self.calls if self.calls else None,
+            max_s=self.max_s,
+            latency_histogram=dict(zip(
+                [f'le_{x}' for x in LATENCY_BUCKETS] + ['gt_last'],
+                self.latency_counts
+            )),
+            mean_payload_bytes=(self.payload_bytes / self.payload_calls
+                                if self.payload_calls else None),
+            max_payload_bytes=self.max_payload_bytes,
+            triggers=dict(self.triggers.most_common()),
+        )
+
+
+class CallbackMetrics():
+    def __init__(self, slow_threshold_s: Optional[float] = None) -> None:
+        self.slow_threshold_s = (
+            slow_threshold_s if slow_threshold_s is not None
+            else float(os.environ.get('GAMEPLAN_SLOW_CALLBACK_S', 1.0))
+        )
+        self._stats: Dict[str, CallbackStats] = {}
+        self._lock = threading.Lock()
+
+    def _get_stats(self, name: str) -> CallbackStats:
+        if name not in self._stats:
+            self._stats[name] = CallbackStats()
+        return self._stats[name]
+
+    def timed(self, fn: Callable) -> Callable:
+        name = f'{fn.__module__}.{fn.__name__}'
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            trigger = _get_trigger()
+            if flask.has_app_context():
+                flask.g.callback_name = name # for record_response
+            failed = True
+            t = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - t
+                with self._lock:
+                    self._get_stats(name).record_call(elapsed, trigger, failed)
+                if elapsed > self.slow_threshold_s:
+                    logger.warning(
+                        "Slow callback %s: %.3fs, triggered by %s, args=%s",
+                        name, elapsed, trigger, _truncated_repr(args)
+                    )
+        return wrapper
+
+    def record_response(self, response: flask.Response) -> flask.Response:
+        name = flask.g.get('callback_name')
+        if name is not None and flask.request.path.endswith(UPDATE_PATH):
+            n_bytes = response.content_length
+            n_bytes = n_bytes if n_bytes is not None else len(response.get_data())
+            with self._lock:
+                self._get_stats(name).record_payload(n_bytes)
+        return response
+
+    def to_dict(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: x.to_dict() for name, x in self._stats.items()}
+
+
+def _get_trigger() -> str:
+    "prop_ids of the input(s) that fired this call, e.g. 'salary_input.value'."
+    try:
+        triggered = dash.callback_context.triggered
+    except Exception: # outside a request, e.g. called directly
+        return 'unknown'
+    return ','.join(x['prop_id'] for x in triggered) or 'initial'
+
+
+def _truncated_repr(args, max_len: int = 200) -> str:
+    return json.dumps([repr(x)[:max_len] for x in args])
+
+
+def instrument_callbacks(app: dash.Dash,
+                         metrics: Optional[CallbackMetrics] = None,
+                         path: str = '/metrics/callbacks',
+                         local_only: bool = True
+                         ) -> CallbackMetrics:
+    "Time callbacks registered on app from here on & serve stats at path."
+    metrics = metrics if metrics is not None else CallbackMetrics()
+    register_callback = app.callback
+
+    @wraps(register_callback)
+    def callback(*args, **kwargs):
+        decorator = register_callback(*args, **kwargs)
+        return lambda fn: decorator(metrics.timed(fn))
+    app.callback = callback
+
+    server = app.server
+    server.after_request(metrics.record_response)
+
+    @server.route(path)
+    def callback_metrics():
+        if local_only and flask.request.remote_addr not in LOCAL_ADDRS:
+            flask.abort(403)
+        return flask.jsonify(metrics.to_dict())
+
+    return metrics
@@ -3,7 +3,6 @@ import dash_html_components as html
 import dash_bootstrap_components as dbc
 
 from datetime import datetime as dt
-from functools import reduce
 import numpy as np
 import pandas as pd
 from plotly import graph_objects as go
@@ -11,7 +10,9 @@ import plotly.express as px
 from typing import List, Optional
 
 
-from gameplan.growth.data_sources import USDAData
+from gameplan.child_expenditures import (
+    get_household_expenditures, get_n_kids_in_household
+)
 
 from dash.dependencies import Input, Output, State
 
@@ -33,7 +34,6 @@ INCOME_GROUPS = [
     '$59,200 to $107,400',
     '> $107,400',
 ]
-DATA = USDAData()
 
 """
 #  Layout Components
@@ -320,87 +320,12 @@ def get_bdays(kids_age_str, n_future_kids, next_kid_min_yrs, next_kid_max_yrs, y
 
     return bdays
 
-def get_n_kids_in_household(kids_bdays: List[pd.datetime],
-                            years_in_household: int = 18
-                           ) -> pd.Series:
-    if len(kids_bdays) == 0:
-        return pd.Series(
-            data=0,
-            index=pd.date_range(
-                start=dt.today(),
-                end=dt.today() + pd.DateOffset(years=10)
-            ),
-            name='n_kids_in_household'
-        )
-
-    date_ranges = [
-        pd.Series(
-            data=1,
-            index=pd.date_range(
-                start=x,
-                end=x + pd.DateOffset(years=18),
-                freq='d'
-            ),
-        )
-        for x in sorted(kids_bdays)
-    ]
-    time_series = pd.concat(date_ranges, axis=1, join='outer').fillna(0).sum(axis=1)
-    time_series.name = 'n_kids_in_household'
-    time_series.loc[min(time_series.index) - pd.DateOffset(days=1)] = 0
-    time_series.loc[max(time_series.index) + pd.DateOffset(days=1)] = 0
-    time_series.sort_index(inplace=True)
-    return time_series
-
-def get_relevant_data(data, region, income_group):
-    relevant_data = data.cleaned_data.get((region, income_group))
-    return relevant_data / 365 # convert to daily basis
-
-def create_age_series(bday):
-    date_range = pd.date_range(
-        start=bday,
-        end=bday + pd.DateOffset(years=18),
-        freq='d'
-    )
-    values = list(range(len(date_range)))
-    return pd.Series(index=date_range, data=values, name='age_in_days')
-
-def create_expenditure_series(bday, relevant_data):
-    age_series = create_age_series(bday)
-    return (
-        age_series
-        .reset_index()
-        .merge(
-            relevant_data,
-            left_on='age_in_days',
-            right_index=True,
-            how='outer'
-        ).fillna(method='ffill')
-        .set_index('index')
-        .drop(columns=['age_in_days'])
-        .resample('M')
-        .sum()
-    )
-
-def combine_expenditures(expenditures):
-    def fn(df1, df2):
-        return df1.add(df2, fill_value=0)
-    return reduce(fn, expenditures)
-
-def get_n_kids_multiplier(n_kids):
-    if n_kids == 1:
-        return 1.27
-    elif n_kids == 2:
-        return 1
-    elif n_kids >= 3:
-        return 0.76
-    else:
-        return 0
-
 def get_n_kids_fig(n_kids_ts):
     fig = px.line(n_kids_ts,
                   x=n_kids_ts.index,
                   y='n_kids_in_household',
                   title="Number of children in household through time",
+                  line_shape='hv', # n_kids_ts only has the dates it changes
                   range_y=(0, n_kids_ts.max() + 2),
                   range_x=(
                     n_kids_ts.index.min() - pd.DateOffset(months=3),
@@ -499,18 +424,8 @@ def update_children_in_household(kids_age_str: str,
     # n_kids_fig = go.Figure()
 
     if len(bdays) > 0:
-        relevant_data = get_relevant_data(DATA, geo, income_group)
-        expenditure_series = [create_expenditure_series(x, relevant_data) for x in bdays]
-        total_expenditures = combine_expenditures(expenditure_series)
-        # print(total_expenditures.head(5))
-        n_kids_multiplier = (
-            n_kids_ts
-            .apply(get_n_kids_multiplier) # Take into account economies of scale w/ multiple kids
-            .reindex(total_expenditures.index)
-            )
-        # print(n_kids_multiplier.head())
-        total_expenditures = total_expenditures.multiply(n_kids_multiplier, axis=0)
-        # print(total_expenditures.head())
+        # Takes into account economies of scale w/ multiple kids
+        total_expenditures = get_household_expenditures(bdays, geo, income_group)
 
         exp_fig, rel_exp_fig = get_expenditures_fig(total_expenditures)
         for_title = f"Married Couple in {geo} w/ Income {income_group} and {len(bdays)} Children"
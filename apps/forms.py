@@ -2,11 +2,12 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 
+import copy
 from datetime import datetime as dt
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 import plotly.express as px
-import scipy.stats as sp
 
 from gameplan.assets import Equity
 from gameplan.expenses import Expenses, Rent, MiscellaneousExpenses
@@ -14,8 +15,8 @@ from gameplan.user import User
 from gameplan.income_streams import Salary
 from gameplan.portfolio import Portfolio
 from gameplan.growth.growth_models import KitcesIncomeGrowthModel
+import gameplan.helpers as hp
 
-# from gameplan.growth.income_percentile_estimate import get_working_population_data
 # from apps.income_forecast import get_income_dist_fig, get_income_trajectory_fig
 import apps.income_forecast as inc
 
@@ -26,7 +27,6 @@ from app import app
 """
 #  Constants
 """
-working_pop = inc.get_working_population_data()
 DMAS = [
     'New York-Northern New Jersey-Long Island, NY-NJ-PA',
     'Los Angeles-Long Beach-Anaheim, CA',
@@ -599,22 +599,21 @@ layout = dbc.Container(
 ## Helper Functions
 """
 
-def create_portfolio(email, dob, dma, inc_pctile, salary, housing_exp,
-                     non_housing_exp, initial_savings, current_investments,
-                     existing_401k_val, ongoing_401k_contrib_pct,
-                     employer_401k_pct, employer_401k_rate,):
-    user = User(
-        email=email,
-        birthday=pd.datetime.fromisoformat(dob),
-        zip_code=dma,
-        income_percentile=inc_pctile
-    )
+PORTFOLIO_CACHE_SIZE = 32
+EXPENSE_TYPES = {
+    'housing expenses': Rent,
+    'non-housing expenses': MiscellaneousExpenses,
+}
+
+
+@lru_cache(maxsize=PORTFOLIO_CACHE_SIZE)
+def build_salary(dob, inc_pctile, salary, today):
+    user = User(birthday=pd.datetime.fromisoformat(dob), income_percentile=inc_pctile)
     sal_grwth_points = user.get_growth_points_to_fit(
         growth_model=KitcesIncomeGrowthModel,
-        start_dt=pd.datetime.today()
+        start_dt=today
     )
-
-    s = Salary(
+    return Salary(
         salary,
         payday_freq='Y',
         growth_points_to_fit=sal_grwth_points,
@@ -622,37 +621,96 @@ def create_portfolio(email, dob, dma, inc_pctile, salary, housing_exp,
         tax_rate=.35
     )
 
-    port = Portfolio(initial_cash_savings=initial_savings, annualized_interest_rate=0.005)
-    port.add_income_stream(s, label='salary', if_exists='overwrite')
 
+@lru_cache(maxsize=PORTFOLIO_CACHE_SIZE)
+def build_expense(label, amount, dob, today):
     retirement_dt = pd.to_datetime(dob) + pd.DateOffset(years=65)
-    port.add_expense(
-        Rent(housing_exp, end_dt=retirement_dt),
-        label='housing expenses',
-        if_exists='overwrite'
-    )
-    port.add_expense(
-        MiscellaneousExpenses(non_housing_exp, end_dt=retirement_dt),
-        label='non-housing expenses',
-        if_exists='overwrite'
+    return EXPENSE_TYPES[label](amount, start_dt=today, end_dt=retirement_dt)
+
+
+@lru_cache(maxsize=PORTFOLIO_CACHE_SIZE)
+def build_equity(init_value, today):
+    date_range = hp.get_default_date_range(Equity.DEFAULT_FREQ, start=today)
+    return Equity(init_value=init_value, date_range=date_range)
+
+
+@lru_cache(maxsize=PORTFOLIO_CACHE_SIZE)
+def build_401k_cash_flows(dob, inc_pctile, salary, today, contrib_pct,
+                          employer_401k_pct, employer_401k_rate):
+    return Portfolio.get_401k_cash_flows(
+        build_salary(dob, inc_pctile, salary, today),
+        contrib_pct=contrib_pct,
+        employer_match=dict(upto=employer_401k_pct, pct_match=employer_401k_rate),
+        label='401k'
     )
 
-    investments = Equity(init_value=current_investments)
+
+def clear_portfolio_cache():
+    for builder in (build_salary, build_expense, build_equity, build_401k_cash_flows):
+        builder.cache_clear()
+
+
+def _fork(obj, **attrs):
+    """
+    Shallow copy of a cached build_* result w/ attrs replaced, for the parts
+    a Portfolio adds to (deductions, contributions); the copy's collection
+    versions move on their own, so results cached on it are dropped.
+    """
+    forked = copy.copy(obj)
+    hp.clear_cached(forked)
+    for name, value in attrs.items():
+        setattr(forked, name, value)
+    return forked
+
+
+def _fork_collection(collection):
+    return _fork(collection, contents=dict(collection.contents))
+
+
+def create_portfolio(email, dob, dma, inc_pctile, salary, housing_exp,
+                     non_housing_exp, initial_savings, current_investments,
+                     existing_401k_val, ongoing_401k_contrib_pct,
+                     employer_401k_pct, employer_401k_rate,):
+    """
+    Assemble a Portfolio from the memoized build_* sub-builders, each keyed
+    on only the inputs it reads, so editing one field rebuilds only its
+    branch (email & dma don't feed the model at all).
+    """
+    today = pd.Timestamp.today().normalize() # cash flows & growth start today
+    s = build_salary(dob, inc_pctile, salary, today)
+    s = _fork(s, deductions=_fork_collection(s.deductions))
+
+    port = Portfolio(initial_cash_savings=initial_savings, annualized_interest_rate=0.005)
+    port.add_income_stream(s, label='salary', if_exists='overwrite')
+
+    for label, amount in [('housing expenses', housing_exp),
+                          ('non-housing expenses', non_housing_exp)]:
+        port.add_expense(build_expense(label, amount, dob, today), label=label,
+                         if_exists='overwrite')
+
+    investments = build_equity(current_investments, today)
     port.add_asset(investments, label='investments', if_exists='overwrite')
 
     # future_investments = Equity(init_value=current_investments)
     # port.add_asset(future_investments, label='future_investments', if_exists='overwrite')
 
     # if existing_401k_val >= 0:
-    existing_401k = Equity(init_value=existing_401k_val)
+    existing_401k = build_equity(existing_401k_val, today)
+    existing_401k = _fork(existing_401k, credits_and_debits=_fork_collection(
+        existing_401k.credits_and_debits
+    ))
     port.add_asset(existing_401k, label='401k', if_exists='overwrite')
 
-    if any([ongoing_401k_contrib_pct, employer_401k_pct]):
+    # No employer match w/o an employee contribution
+    if ongoing_401k_contrib_pct:
         port.add_401k_contribution(
             income_stream_label='salary',
             contrib_pct=ongoing_401k_contrib_pct,
             employer_match=dict(upto=employer_401k_pct, pct_match=employer_401k_rate),
-            label='401k'
+            label='401k',
+            cash_flows=build_401k_cash_flows(dob, inc_pctile, salary, today,
+                                             ongoing_401k_contrib_pct,
+                                             employer_401k_pct, employer_401k_rate)
         )
 
     return port
@@ -673,20 +731,14 @@ def set_age_buckets(dob):
     Output('cohort-df', 'children'),
     [
         Input(component_id='geo_input', component_property='value'),
-        Input('salary_input', 'value'),
         Input('age_cohort_input', 'value'),
         Input('gender_input', 'value'),
     ]
     )
-def get_cohort_df(dma, salary, age_range, gender):
-     cleaned_df = inc.get_cohort_subset(
-        df=working_pop,
-        dma=dma,
-        age_range=age_range,
-        gender=gender
-        )
-
-     return cleaned_df.to_json(date_format='iso', orient='split')
+def get_cohort_df(dma, age_range, gender):
+     cohort_key = inc.make_key(msa=dma, age_range=age_range, gender=gender)
+     inc.get_cohort_income_index() # warm the index for the callbacks downstream
+     return cohort_key
 
 @app.callback(
     Output(component_id='forms-income-trajectory-graph', component_property='figure'),
@@ -718,9 +770,8 @@ def update_income_trajectory_figure(salary, dob, percentile):
         Input('salary_input', 'value'),
     ]
 )
-def update_percentile_text(cohort_json, salary):
-    cohort_df = pd.read_json(cohort_json, orient='split')
-    perc = sp.percentileofscore(cohort_df.inctot, salary)
+def update_percentile_text(cohort_key, salary):
+    perc = inc.get_cohort_percentile(cohort_key, salary)
     for_text = f"**{inc.get_percentile_label(perc)} percentile** in terms of total annual income"
     return for_text, inc.get_pctile_for_growth(perc)
 
@@ -777,5 +828,5 @@ def update_savings_graph(email, dob, dma, inc_pctile, salary, housing_exp,
 
     # to_plt = port.assets.generate_path_df().reset_index().melt(id_vars='index')
     # return px.line(to_plt, x='index', y='value', color='variable')
-    to_plt = port.assets.contents['401k'].simulate_path().reset_index()
+    to_plt = port.assets.contents['401k'].value_through_time.reset_index()
     return px.line(to_plt, x='index', y='total_value')
@@ -9,16 +9,15 @@ import plotly.graph_objects as go
 
 import numpy as np
 import pandas as pd
-import scipy.stats as sp
 
-from gameplan.growth.income_percentile_estimate import get_working_population_data
+from gameplan.growth.income_percentile_estimate import get_cohort_income_index
 from gameplan.growth.growth_models import KitcesIncomeGrowthModel
 from gameplan.user import User
 from gameplan.income_streams import Salary
 
 from app import app
+from apps.result_store import make_key, parse_key
 
-working_pop = get_working_population_data()
 MSAS = [
     'New York-Northern New Jersey-Long Island, NY-NJ-PA',
     'Los Angeles-Long Beach-Anaheim, CA',
@@ -197,7 +196,7 @@ layout = html.Div(children=
 # Helper functions
 """
 def get_percentile_label(x):
-    pctile = round(x) # sp.percentile returns percentiles out of 100, not 1
+    pctile = round(x) # percentiles are out of 100, not 1
     last_digit = str(pctile)[-1]
     suffix_dict = {
         '1' : 'st',
@@ -207,34 +206,18 @@ def get_percentile_label(x):
 
     return f"{pctile}{suffix_dict.get(last_digit, 'th')}"
 
-def construct_subset_query(msa, age_range, gender):
-    if gender in ['Male', 'Female']:
-        gender_clause = f"sex == '{gender}'"
-    else:
-        gender_clause = "(sex == 'Male' | sex == 'Female')"
-    query = f" \
-        metarea.str.contains(@msa) \
-        & AGE.between(@age_range[0], @age_range[1]) \
-        & {gender_clause} \
-        "
-    return query
-
-def get_cohort_subset(df, msa, age_range, gender) -> pd.DataFrame:
-    query = construct_subset_query(msa, age_range, gender)
-    return df.query(query)
-
-def get_cdf(df):
-    df['weight'] = df.ASECWT / df.ASECWT.sum()
-    dist = df.sort_values('inctot').loc[:, ['inctot', 'weight']]
-    dist['cdf'] = dist.weight.cumsum()
-    return dist
-
-def get_income_dist_fig(df, salary, msa, age_range, gender, return_pctile=True):
-    subset = get_cohort_subset(df, msa, age_range, gender)
-    dist = get_cdf(subset)
-    percentile = dist.loc[dist['inctot'] >= int(salary), 'cdf'].iloc[0]
-    percentile = int(round(100 * percentile))
-    # percentile = sp.percentileofscore(dist.inctot, int(salary))
+def get_cohort_percentile(cohort_key, salary) -> float:
+    """
+    Weighted percentile of salary within the cohort named by a
+    make_key(msa=, age_range=, gender=) key, via the shared cohort index.
+    """
+    return get_cohort_income_index().percentile(salary, **parse_key(cohort_key))
+
+def get_income_dist_fig(salary, msa, age_range, gender, return_pctile=True):
+    index = get_cohort_income_index()
+    dist = index.cdf(msa, age_range, gender)
+    percentile = index.percentile(int(salary), msa, age_range, gender)
+    percentile = int(round(percentile))
 
     dist.rename(
         columns={
@@ -300,7 +283,7 @@ def get_income_dist_fig(df, salary, msa, age_range, gender, return_pctile=True):
     fig.update_layout(layout)
     fig.add_annotation(
         showarrow=False,
-        text=f'Cohort sample includes {len(subset):,.0f} individuals.',
+        text=f'Cohort sample includes {len(dist):,.0f} individuals.',
         x=1,
         y=-0.1,
         xref='paper', yref='paper',
@@ -320,17 +303,19 @@ def get_pctile_for_growth(x):
         pctile = np.floor(x/10)*10
     return pctile
 
-def get_salary_trajectory(pctile_for_growth, age, current_salary):
-    user = User(
-        email='placeholder',
-        birthday=pd.datetime.today() - pd.DateOffset(years=age),
-        income_percentile=pctile_for_growth
-        )
+def get_salary_trajectory(pctile_for_growth, age, current_salary,
+                          sal_grwth_points=None):
+    if sal_grwth_points is None:
+        user = User(
+            email='placeholder',
+            birthday=pd.datetime.today() - pd.DateOffset(years=age),
+            income_percentile=pctile_for_growth
+            )
 
-    sal_grwth_points = user.get_growth_points_to_fit(
-        growth_model=KitcesIncomeGrowthModel,
-        start_dt=pd.datetime.today()
-    )
+        sal_grwth_points = user.get_growth_points_to_fit(
+            growth_model=KitcesIncomeGrowthModel,
+            start_dt=pd.datetime.today()
+        )
     s = Salary(
         current_salary,
         payday_freq='Y',
@@ -353,8 +338,18 @@ def get_growth_scenarios(percentile, age, current_salary):
     elif pctile_for_growth <= 10:
         growth_scenarios.pop('Pessimistic')
 
-    for scn, v in growth_scenarios.items():
-        v['sal_traj'] = get_salary_trajectory(v['grwth_pctile'], age, current_salary)
+    # Growth points for every scenario come from one batched evaluation
+    today = pd.datetime.today()
+    growth_model = KitcesIncomeGrowthModel(
+        user_birthday=today - pd.DateOffset(years=age)
+    )
+    all_points = growth_model.get_growth_points_to_fit_batch(
+        percentiles=[v['grwth_pctile'] for v in growth_scenarios.values()],
+        start_dts=[today] * len(growth_scenarios),
+    )
+    for v, points in zip(growth_scenarios.values(), all_points):
+        v['sal_traj'] = get_salary_trajectory(v['grwth_pctile'], age,
+                                              current_salary, points)
 
     return growth_scenarios
 
@@ -406,23 +401,15 @@ def set_age_buckets(age_input):
     Output('subset-df', 'children'),
     [
         Input(component_id='msa', component_property='value'),
-        Input('annual_income', 'value'),
         Input('age_range', 'value'),
         Input('gender', 'value'),
     ]
     )
-def get_subset_df(msa, salary, age_range, gender):
-     # some expensive clean data step
-     cleaned_df = get_cohort_subset(
-        df=working_pop,
-        msa=msa,
-        age_range=age_range,
-        gender=gender
-        )
-
-     # more generally, this line would be
-     # json.dumps(cleaned_df)
-     return cleaned_df.to_json(date_format='iso', orient='split')
+def get_subset_df(msa, age_range, gender):
+     # Only the cohort's key goes to the page, see get_cohort_percentile
+     cohort_key = make_key(msa=msa, age_range=age_range, gender=gender)
+     get_cohort_income_index() # warm the index for the callbacks downstream
+     return cohort_key
 
 @app.callback(
     [
@@ -438,7 +425,6 @@ def get_subset_df(msa, salary, age_range, gender):
 )
 def update_income_dist_figure(msa, salary, age_range, gender):
     fig, percentile = get_income_dist_fig(
-        df=working_pop,
         msa=msa,
         salary=salary,
         age_range=age_range,
@@ -456,10 +442,8 @@ def update_income_dist_figure(msa, salary, age_range, gender):
         Input('age_input', 'value'),
     ],
 )
-def update_income_trajectory_figure(cohort_json, salary, age):
-    cohort_df = pd.read_json(cohort_json, orient='split')
-    dist = get_cdf(cohort_df) # this isn't doing any weighting right?
-    percentile = sp.percentileofscore(dist.inctot, int(salary))
+def update_income_trajectory_figure(cohort_key, salary, age):
+    percentile = get_cohort_percentile(cohort_key, int(salary))
     fig = get_income_trajectory_fig(
         salary=salary,
         age=age,
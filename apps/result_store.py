@@ -0,0 +1,124 @@
+"""
+Server-side store for intermediate callback results (e.g. cohort subsets),
+so callbacks pass a small key through the page instead of serializing whole
+DataFrames into hidden divs.
+
+Keys are the JSON-encoded parameters the result was computed from, so any
+worker that misses (evicted, or a different gunicorn worker) can recompute.
+The backend is picked by GAMEPLAN_RESULT_STORE ('memory', the default, or
+'disk', which shares results between workers via GAMEPLAN_RESULT_STORE_DIR)
+& holds up to GAMEPLAN_RESULT_STORE_SIZE (default DEFAULT_MAXSIZE) results.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from typing import Callable, Optional
+
+DEFAULT_MAXSIZE = 128
+
+
+def make_key(**params) -> str:
+    return json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+
+def parse_key(key: str) -> dict:
+    return json.loads(key)
+
+
+class MemoryResultStore():
+    "In-process LRU store, bounded to maxsize entries."
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE) -> None:
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class DiskResultStore():
+    "Pickles results to directory, evicting the least recently used files."
+    def __init__(self, directory: str, maxsize: int = DEFAULT_MAXSIZE) -> None:
+        self.directory = directory
+        self.maxsize = maxsize
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, f'{digest}.pkl')
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(path) # mark as recently used
+        except OSError: # evicted by another worker since, but we have it
+            pass
+        return value
+
+    def put(self, key: str, value) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        paths = [
+            os.path.join(self.directory, x) for x in os.listdir(self.directory)
+            if x.endswith('.pkl')
+        ]
+        if len(paths) <= self.maxsize:
+            return
+        paths.sort(key=lambda x: os.path.getmtime(x) if os.path.exists(x) else 0)
+        for path in paths[:len(paths) - self.maxsize]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass # another worker got to it first
+
+
+class ResultStore():
+    def __init__(self, backend=None) -> None:
+        self.backend = backend if backend is not None else self._default_backend()
+
+    @staticmethod
+    def _default_backend():
+        maxsize = int(os.environ.get('GAMEPLAN_RESULT_STORE_SIZE', DEFAULT_MAXSIZE))
+        if os.environ.get('GAMEPLAN_RESULT_STORE', 'memory') == 'disk':
+            directory = os.environ.get(
+                'GAMEPLAN_RESULT_STORE_DIR',
+                os.path.join(tempfile.gettempdir(), 'gameplan_results')
+            )
+            return DiskResultStore(directory, maxsize=maxsize)
+        return MemoryResultStore(maxsize=maxsize)
+
+    def get_or_compute(self, key: str, compute_fn: Callable[..., object]):
+        "compute_fn is called with the key's params on a miss."
+        value = self.backend.get(key)
+        if value is None:
+            value = compute_fn(**parse_key(key))
+            self.backend.put(key, value)
+        return value
+
+
+COHORT_STORE = ResultStore()
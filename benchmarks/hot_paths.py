@@ -0,0 +1,265 @@
+"""
+Benchmarks for the modeling hot paths, on synthetic inputs w/ fixed seeds,
+over 1/20/50 year horizons at daily/monthly/yearly frequency. Reports wall
+time (min & median of --repeat runs) & peak traced memory (one extra run
+under tracemalloc), and can gate on a stored baseline: fails (exit code 1)
+if any case's median time or peak memory grew by more than --tolerance.
+
+    python -m benchmarks.hot_paths
+    python -m benchmarks.hot_paths --save-baseline benchmarks/baseline.json
+    python -m benchmarks.hot_paths --baseline benchmarks/baseline.json
+    python -m benchmarks.hot_paths --filter cash_savings --repeat 10
+
+Gating on a baseline also runs the import-time budget check (see
+benchmarks.import_budget) & fails if it does, unless --skip-import-budget.
+
+Process-wide caches (time grids, growth fits, discount curves & the forms
+app's portfolio builders) are cleared before every run so each one
+measures the real work; --warm keeps them.
+Baselines are machine specific, so save one per machine/CI runner.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SEED = 0
+HORIZONS = (1, 20, 50)
+FREQS = {'D': 'D', 'M': 'MS', 'Y': 'Y'}
+SALARY_GROWTH_POINTS = [(0, 1.0), (3650, 1.5), (7300, 1.8), (9000, 1.9)]
+RENT_GROWTH_POINTS = [(0, 1), (5 * 365, 1.75), (10 * 365, 2.25)]
+START = pd.Timestamp.today().normalize()
+
+# name -> (setup(horizon, freq) -> timed zero-arg callable, freqs to run)
+CASES: Dict[str, tuple] = {}
+
+
+def case(name: str, freqs=tuple(FREQS)):
+    def register(setup: Callable) -> Callable:
+        CASES[name] = (setup, freqs)
+        return setup
+    return register
+
+
+def _end(horizon: int) -> pd.Timestamp:
+    return START + pd.DateOffset(years=horizon)
+
+
+def _salary(horizon: int, freq: str):
+    from gameplan.income_streams import Salary
+    return Salary(5000, payday_freq=FREQS[freq], next_paycheck_dt=START,
+                  last_paycheck_dt=_end(horizon), tax_rate=.35,
+                  growth_points_to_fit=SALARY_GROWTH_POINTS)
+
+
+@case('cashflow_construction')
+def _cashflow_construction(horizon, freq):
+    from gameplan.cashflows import CashFlow
+    from gameplan.growth.growth_series import LogisticGrowth
+    return lambda: CashFlow(
+        cashflow_type='expense', name='bench', amount=100.0, recurring=True,
+        freq=FREQS[freq], start_dt=START, end_dt=_end(horizon), outflow=True,
+        growth_series=LogisticGrowth,
+        addtl_growth_params=dict(points_to_fit=RENT_GROWTH_POINTS),
+        incorporate_growth=True, incorporate_discounting=True,
+    )
+
+
+@case('growth_series')
+def _growth_series(horizon, freq):
+    from gameplan.growth.growth_series import LogisticGrowth
+    growth = LogisticGrowth(start_dt=START, end_dt=_end(horizon),
+                            freq=FREQS[freq], points_to_fit=RENT_GROWTH_POINTS)
+    return lambda: growth.growth_series
+
+
+@case('take_home_salary')
+def _take_home_salary(horizon, freq):
+    salary = _salary(horizon, freq)
+    salary.add_deduction(label='401k', pct=.05, max_amt=19500, max_amt_freq='Y')
+    return lambda: salary.take_home_salary
+
+
+@case('asset_value_through_time')
+def _asset_value_through_time(horizon, freq):
+    from gameplan.assets import CashSavings
+    from gameplan.contributions import Contribution
+    cs = CashSavings(initial_balance=10000, annualized_interest_rate=.005,
+                     date_range=pd.date_range(START, _end(horizon), freq='D'))
+    cs.add_contribution(Contribution('deposits', amount=500.0, recurring=True,
+                                     freq=FREQS[freq], start_dt=START,
+                                     end_dt=_end(horizon)))
+    return lambda: cs.value_through_time
+
+
+@case('portfolio_cash_savings')
+def _portfolio_cash_savings(horizon, freq):
+    from gameplan.expenses import MiscellaneousExpenses, Rent
+    from gameplan.portfolio import Portfolio
+    port = Portfolio(initial_cash_savings=10000, annualized_interest_rate=.005)
+    port.add_income_stream(_salary(horizon, freq), label='salary')
+    port.add_expense(Rent(2000, start_dt=START, end_dt=_end(horizon),
+                          freq=FREQS[freq]), label='rent')
+    port.add_expense(MiscellaneousExpenses(1000, start_dt=START,
+                                           end_dt=_end(horizon),
+                                           freq=FREQS[freq]), label='misc')
+    return lambda: port.cash_savings
+
+
+@case('goal_seek_expense_budget', freqs=('M',))
+def _goal_seek_expense_budget(horizon, freq):
+    # lo=0 removes the only expense, so this also checks that bracketing
+    # from 0 sees no outflows (it raises if the bracket is wrong)
+    from gameplan.expenses import Rent
+    from gameplan.goal_seek import solve_expense_budget
+    from gameplan.portfolio import Portfolio
+    port = Portfolio(initial_cash_savings=10000, annualized_interest_rate=.005)
+    port.add_income_stream(_salary(horizon, freq), label='salary')
+    port.add_expense(Rent(4000, start_dt=START, end_dt=_end(horizon),
+                          freq=FREQS[freq]), label='rent')
+    port.cash_savings # as after viewing it, so there's a debit to drop
+    return lambda: solve_expense_budget(port, label='rent', lo=0.0)
+
+
+@case('create_portfolio', freqs=(None,))
+def _create_portfolio(horizon, freq):
+    from apps.forms import create_portfolio # needs the dash app
+    # create_portfolio runs cash flows through age 65
+    dob = (_end(horizon) - pd.DateOffset(years=65)).date().isoformat()
+    return lambda: create_portfolio(
+        email='bench@example.com', dob=dob, dma=None, inc_pctile=50,
+        salary=100000, housing_exp=2000, non_housing_exp=1000,
+        initial_savings=10000, current_investments=5000,
+        existing_401k_val=1000, ongoing_401k_contrib_pct=.05,
+        employer_401k_pct=.05, employer_401k_rate=.5,
+    )
+
+
+def reset_state(warm: bool = False) -> None:
+    "Seed every RNG the models draw from &, unless warm, drop shared caches."
+    np.random.seed(SEED)
+    random.seed(SEED)
+    if warm:
+        return
+    from gameplan.discounting import _get_discount_curve
+    from gameplan.growth.growth_series import FIT_CACHE
+    from gameplan.time_grid import get_time_grid
+    FIT_CACHE.clear()
+    get_time_grid.cache_clear()
+    _get_discount_curve.cache_clear()
+    if 'apps.forms' in sys.modules:
+        sys.modules['apps.forms'].clear_portfolio_cache()
+
+
+def measure(setup: Callable, horizon: int, freq: Optional[str],
+            repeat: int = 5, warm: bool = False) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        reset_state(warm)
+        run = setup(horizon, freq)
+        t = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t)
+    reset_state(warm)
+    run = setup(horizon, freq)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return dict(min_s=min(times), median_s=statistics.median(times),
+                peak_bytes=peak)
+
+
+def run_cases(pattern: Optional[str] = None, repeat: int = 5,
+              warm: bool = False) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, (setup, freqs) in CASES.items():
+        for horizon, freq in ((h, f) for h in HORIZONS for f in freqs):
+            key = f"{name}[{horizon}y{'-' + freq if freq else ''}]"
+            if pattern and pattern not in key:
+                continue
+            try:
+                results[key] = measure(setup, horizon, freq, repeat, warm)
+            except ImportError as e:
+                print(f"{name}: skipped ({e})")
+                break
+            print(f"{key}: median {results[key]['median_s'] * 1e3:.1f}ms "
+                  f"min {results[key]['min_s'] * 1e3:.1f}ms "
+                  f"peak {results[key]['peak_bytes'] / 2**20:.1f}MiB")
+    return results
+
+
+def environment() -> Dict[str, str]:
+    return dict(python=platform.python_version(), numpy=np.__version__,
+                pandas=pd.__version__, machine=platform.machine())
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: dict,
+            tolerance: float) -> List[str]:
+    "Descriptions of every regression beyond tolerance vs baseline."
+    if baseline.get('environment') != environment():
+        print(f"Warning: baseline environment {baseline.get('environment')} "
+              f"differs from {environment()}")
+    regressions = []
+    for key, result in results.items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        for metric in ('median_s', 'peak_bytes'):
+            ratio = result[metric] / base[metric] if base[metric] else 1.0
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    f"{key} {metric}: {result[metric]:.4g} vs baseline "
+                    f"{base[metric]:.4g} ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--filter', help="only run cases containing this")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warm', action='store_true',
+                        help="keep shared caches between runs")
+    parser.add_argument('--baseline', help="baseline json to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed fractional slowdown/memory growth")
+    parser.add_argument('--save-baseline', help="write results to this json")
+    parser.add_argument('--skip-import-budget', action='store_true',
+                        help="don't run the import budget check w/ --baseline")
+    args = parser.parse_args(argv)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = run_cases(args.filter, args.repeat, args.warm)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(dict(environment=environment(), results=results), f,
+                      indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = bool(regressions)
+        if not args.skip_import_budget:
+            from benchmarks import import_budget
+            failed |= bool(import_budget.main(list(import_budget.BUDGETS)))
+        return int(failed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
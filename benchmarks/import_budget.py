@@ -0,0 +1,76 @@
+"""
+Import-time budget check. Each target is imported in a fresh interpreter;
+fails (exit code 1) if an import takes longer than its budget or if it
+eagerly builds any of the lazily-shared defaults (date ranges, asset
+returns, Kitces/USDA data).
+
+    python -m benchmarks.import_budget
+    IMPORT_BUDGET_SCALE=2 python -m benchmarks.import_budget  # slow machines
+"""
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+# Seconds, on top of importing pandas/scipy themselves
+BUDGETS = {
+    'gameplan.portfolio': 0.5,
+    'index': 2.0,
+}
+
+PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import pandas, scipy.optimize
+baseline = time.perf_counter() - t
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+
+import gameplan.helpers as hp
+from gameplan.growth import asset_returns, data_sources
+eager = [
+    name for name, built in [
+        ('default date ranges', hp._get_date_range.cache_info().currsize),
+        ('asset returns', asset_returns.get_asset_returns.cache_info().currsize),
+        ('kitces data', data_sources.get_kitces_data.cache_info().currsize),
+        ('usda data', data_sources.get_usda_data.cache_info().currsize),
+        ('fecon236', 'fecon236' in sys.modules),
+    ] if built
+]
+print(json.dumps(dict(baseline=baseline, elapsed=elapsed, eager=eager)))
+"""
+
+
+def measure(module: str) -> Dict[str, object]:
+    out = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', PROBE.format(module=module)],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(modules: List[str]) -> int:
+    scale = float(os.environ.get('IMPORT_BUDGET_SCALE', 1.0))
+    failed = False
+    for module in modules:
+        budget = BUDGETS[module] * scale
+        try:
+            result = measure(module)
+        except subprocess.CalledProcessError:
+            print(f"{module}: FAIL (import failed, see traceback above)")
+            failed = True
+            continue
+        ok = result['elapsed'] <= budget and not result['eager']
+        failed |= not ok
+        print(
+            f"{module}: {result['elapsed']:.3f}s (budget {budget:.3f}s, "
+            f"pandas/scipy {result['baseline']:.3f}s) "
+            f"eager={result['eager']} {'OK' if ok else 'FAIL'}"
+        )
+    return int(failed)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:] or list(BUDGETS)))
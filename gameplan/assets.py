@@ -5,11 +5,24 @@ import random
 from gameplan.cashflows import CashFlow
 from gameplan.gp_collections import CashFlowCollection, Collection
 from gameplan.contributions import Contribution
-from gameplan.growth.asset_returns import AssetReturns
+from gameplan.growth.asset_returns import get_asset_returns
+import gameplan.helpers as hp
+from gameplan import profiling
+from gameplan.time_grid import to_epoch_days
+
+
+def _to_days(dates) -> np.ndarray:
+    return to_epoch_days(pd.DatetimeIndex(dates).normalize())
+
+
+def _step_lookup(days, values, query_days) -> np.ndarray:
+    "values at the last of (sorted) days on or before each query day, else 0."
+    pos = np.searchsorted(days, query_days, side='right') - 1
+    return np.where(pos >= 0, values[np.clip(pos, 0, None)], 0.0)
 
 
 class Asset():
-    RETURNS = AssetReturns()
+    SCAN_BLOCK_SIZE = 365 # re-base compounding yearly to keep it stable
 
     def __init__(self, asset_type, initial_balance, date_range):
         self.asset_type = asset_type
@@ -38,8 +51,8 @@ class Asset():
     def _get_compound_factors(self, date_diffs, *args, **kwargs):
         raise NotImplementedError
 
-    @property
-    def value_through_time(self):
+    @profiling.stage()
+    def _get_daily_credits_and_debits(self):
         full_index = pd.DatetimeIndex.union(
             self.credits_and_debits.total.index,
             self.date_range
@@ -49,70 +62,195 @@ class Asset():
             .reindex(index=full_index, fill_value=0)
             .resample('D').sum() # downsample to daily)
         ) # get a daily view of credits_and_debits over the entire self.date_range
+        return t
+
+    def _value_cache_key(self):
+        "Anything value_through_time depends on that can change after init."
+        return (self.credits_and_debits._cache_key(),)
+
+    @property
+    @hp.cached_until_changed(lambda self: self._value_cache_key())
+    @profiling.stage()
+    def value_through_time(self):
+        t = self._get_daily_credits_and_debits()
         date_diffs = t.index.to_series().diff()
         compound_factors = self._get_compound_factors(date_diffs)
-
-        totals = []
-        total = 0
-        for x, r in zip(t.values, compound_factors.values):
-            r = r if pd.notnull(r) else 0
-            total = x + r * total
-            totals.append(total)
+        totals = hp.accumulate_compounded(
+            flows=t.values,
+            factors=compound_factors.values,
+            block_size=self.SCAN_BLOCK_SIZE
+        )
 
         return pd.Series(data=totals, index=t.index, name='total_value')
 
+    @property
+    @hp.cached_until_changed(lambda self: self._value_cache_key())
+    def _value_index(self):
+        "(epoch days, values) of value_through_time, for values_at lookups."
+        values = self.value_through_time
+        return to_epoch_days(values.index), values.values
+
+    def values_at(self, dates) -> np.ndarray:
+        """
+        Value at the end of each of dates, by binary search on a value index
+        built once per change to credits_and_debits. Dates outside the
+        asset's days take the nearest end's value, as generate_path_df
+        backfills.
+        """
+        days, values = self._value_index
+        return _step_lookup(days, values, np.clip(_to_days(dates), days[0], days[-1]))
+
+    def value_at(self, dt) -> float:
+        return float(self.values_at([dt])[0])
+
+    def value_paths(self, compound_factors):
+        """
+        Path-batched value_through_time: compound_factors is an
+        (n_paths, n_days) array over the daily index of credits_and_debits;
+        returns an (n_paths, n_days) array of values.
+        """
+        t = self._get_daily_credits_and_debits()
+        compound_factors = np.asarray(compound_factors, dtype=float)
+        if compound_factors.shape[-1] != len(t):
+            raise ValueError(
+                f"compound_factors must have {len(t)} columns, one per day"
+            )
+        return hp.accumulate_compounded(
+            flows=t.values,
+            factors=compound_factors,
+            block_size=self.SCAN_BLOCK_SIZE
+        )
+
 
 class CashSavings(Asset):
     # How much cash do you currently have across all of your checking and savings accounts? $_______
     # What proportion of your take-home pay do you expect to go to these accounts over the course of the next few years (on average)? ______%
-    DEFAULT_DATE_RANGE = pd.date_range(
-        start=pd.datetime.today().date(),
-        end=pd.datetime.today().date() + pd.DateOffset(years=20),
-        freq='D'
-    )
+    DEFAULT_FREQ = 'D'
+
     def __init__(self, initial_balance=0, annualized_interest_rate=0.0,
-                 date_range=DEFAULT_DATE_RANGE):
+                 date_range=None):
         super().__init__(
             asset_type='cash_savings',
             initial_balance=initial_balance,
-            date_range = date_range
+            date_range = (date_range if date_range is not None
+                          else hp.get_default_date_range(self.DEFAULT_FREQ))
             )
         self.annualized_interest_rate = annualized_interest_rate
 
 
+    def _value_cache_key(self):
+        return super()._value_cache_key() + (self.annualized_interest_rate,)
+
+    def _growth(self, days):
+        "Continuous compounding over days, as in _get_compound_factors."
+        return np.exp(self.annualized_interest_rate * np.asarray(days) / 365.25)
+
+    @property
+    @hp.cached_until_changed(lambda self: self._value_cache_key())
+    def _flow_index(self):
+        """
+        (first day, last day, flow days, cumulative flows discounted to the
+        first day). With a constant rate, the value on day t is
+        _growth(t - first day) * the cumulative sum through t, so this
+        needs one entry per flow date rather than per day.
+        """
+        aligned = self.credits_and_debits._aligned
+        grid_days = to_epoch_days(self.date_range[[0, -1]])
+        first = min(aligned.days[0], grid_days[0])
+        last = max(aligned.days[-1], grid_days[1])
+        discounted = aligned.totals / self._growth(aligned.days - first)
+        return first, last, aligned.days, np.cumsum(discounted)
+
+    def values_at(self, dates) -> np.ndarray:
+        "Asset.values_at, evaluated analytically from the flows alone."
+        first, last, flow_days, cum_discounted = self._flow_index
+        days = np.clip(_to_days(dates), first, last)
+        return _step_lookup(flow_days, cum_discounted, days) * self._growth(days - first)
+
     def _get_compound_factors(self, date_diffs):
-        return date_diffs.apply(
-            lambda x: np.e**(self.annualized_interest_rate * x.days / 365.25)
-            )
+        days = date_diffs / pd.Timedelta('1D')
+        return np.exp(self.annualized_interest_rate * days / 365.25)
 
 
 class Equity(Asset): # should be type Investment
-    DEFAULT_DATE_RANGE = pd.date_range(
-        start=pd.datetime.today().date(),
-        end=pd.datetime.today().date() + pd.DateOffset(years=20),
-        freq='B'
-    )
+    DEFAULT_FREQ = 'B'
 
-    def __init__(self, ticker='SPY', init_value=1, date_range=DEFAULT_DATE_RANGE):
+    def __init__(self, ticker='SPY', init_value=1, date_range=None, n_paths=1,
+                 seed=None):
+        """
+        The first (up to EquityReturnsSeries.MAX_SHARED_PATHS) return paths
+        are shared w/ other assets on ticker; any beyond are this asset's
+        own, drawn from seed as far out as its cash flows need.
+        """
         super().__init__(
             asset_type='equity',
             initial_balance=init_value,
-            date_range = date_range
+            date_range = (date_range if date_range is not None
+                          else hp.get_default_date_range(self.DEFAULT_FREQ))
             )
-        self.returns_series = Asset.RETURNS.get_returns_series(
+        self.n_paths = n_paths
+        self.returns_series = get_asset_returns().get_returns_series(
             asset_type='equity',
-            ticker=ticker
+            ticker=ticker,
+            n_paths=n_paths
             )
+        self._rng = hp.get_rng(seed)
+        self._own_returns = np.empty(
+            (max(n_paths - self.returns_series.n_paths, 0), 0)
+        )
 
-    def _get_compound_factors(self, date_diffs):
-        returns_path = self.returns_series.returns_df['sim_1'] # just take 1st sim
-        return (returns_path
-                .shift(1)
-                .reindex(date_diffs.index)
-                .resample('D')
-                .first()
-                .fillna(1.0)
+    def _get_own_returns(self, n_dates):
+        "This asset's extra paths, extended (w/ new draws) to n_dates dates."
+        n_missing = n_dates - self._own_returns.shape[1]
+        if len(self._own_returns) and n_missing > 0:
+            self._own_returns = np.hstack([
+                self._own_returns,
+                self.returns_series.generate_return_paths(
+                    len(self._own_returns), n_obs=n_missing, rng=self._rng
                 )
+            ])
+        return self._own_returns
+
+    def _get_compound_factor_paths(self, daily_index):
+        """
+        (n_paths, n_days) compound factors over daily_index; each business
+        day compounds by the previous business day's return, other days by 1.
+        """
+        pos = self.returns_series.date_range.get_indexer(daily_index)
+        cols = np.clip(pos - 1, 0, None)
+        n_own = len(self._own_returns)
+        factors = self.returns_series.returns_matrix[:self.n_paths - n_own, cols]
+        if n_own:
+            own = self._get_own_returns(cols.max() + 1 if len(cols) else 0)
+            factors = np.concatenate([factors, own[:, cols]])
+        factors[:, pos < 1] = 1.0
+        return factors
+
+    def _get_compound_factors(self, date_diffs):
+        factors = self._get_compound_factor_paths(date_diffs.index)
+        return pd.Series(factors[0], index=date_diffs.index) # just take 1st sim
+
+    @property
+    def value_paths_through_time(self):
+        "Value of each of the n_paths simulations, one column per path."
+        t = self._get_daily_credits_and_debits()
+        paths = hp.accumulate_compounded(
+            flows=t.values,
+            factors=self._get_compound_factor_paths(t.index),
+            block_size=self.SCAN_BLOCK_SIZE
+        )
+        return pd.DataFrame(
+            data=paths.T,
+            index=t.index,
+            columns=self.returns_series.get_path_labels(self.n_paths)
+        )
+
+    def value_quantiles(self, quantiles=(0.1, 0.25, 0.5, 0.75, 0.9)):
+        "Per-day quantiles across paths, e.g. for a fan chart."
+        paths = self.value_paths_through_time
+        summary = np.quantile(paths.values, quantiles, axis=1).T
+        return pd.DataFrame(data=summary, index=paths.index,
+                            columns=list(quantiles))
 
 
 class Assets(Collection):
@@ -140,7 +278,20 @@ class Assets(Collection):
     def generate_value_path(self):
         return self.generate_path_df()['total']
 
+    def values_at(self, dates) -> pd.DataFrame:
+        "Each asset's values_at dates (one column per asset) & their total."
+        dates = pd.DatetimeIndex(dates)
+        df = pd.DataFrame(
+            {k: v.values_at(dates) for k, v in self.contents.items()},
+            index=dates
+        )
+        df['total'] = df.sum(axis=1)
+        return df
+
+    def value_at(self, dt) -> float:
+        "Total value of all assets at the end of dt."
+        return float(sum(v.value_at(dt) for v in self.contents.values()))
+
     @property
     def current_value(self):
-        today = pd.datetime.today().date()
-        return self.generate_value_path()[today:].iloc[0]
+        return self.value_at(pd.datetime.today())
@@ -1,16 +1,20 @@
 from datetime import datetime
 import numpy as np
 import pandas as pd
-from typing import Callable, List, Optional, Union
+from typing import Callable, List, Optional, Tuple, Union
 import warnings
 
 from gameplan.growth.growth_series import GrowthSeries
 import gameplan.helpers as hp
+from gameplan import profiling
+from gameplan.discounting import RatesLike, get_discount_curve
+from gameplan.time_grid import TimeGrid
 
 
 class CashFlow():
     DEFAULT_END_DT_OFFSET = pd.DateOffset(years=20)
 
+    @profiling.stage()
     def __init__(self,
                  cashflow_type: str,
                  name: str,
@@ -29,6 +33,7 @@ class CashFlow():
                  growth_start_dt: Optional[Union[str, datetime]] = None,
                  growth_end_dt: Optional[Union[str, datetime]] = None,
                  growth_per_period_fn: Optional[Callable] = None,
+                 growth_rate_sampler: Optional[Callable] = None,
                  addtl_growth_params: dict = {},
                  incorporate_growth: bool = False,
                  incorporate_discounting: bool = False,
@@ -37,6 +42,9 @@ class CashFlow():
                  **kwargs
                  ) -> None:
         """
+        growth_per_period_fn & growth_rate_sampler are only passed on to
+        growth_series when given, so it can supply its own defaults (e.g.
+        StochasticGrowth's vectorized sampler).
         """
         self._cashflow_type = cashflow_type
         self.name = name
@@ -46,6 +54,7 @@ class CashFlow():
             self.start_dt = date_range.min()
             self.end_dt = date_range.max()
             self.freq = date_range.freq
+            self._grid = TimeGrid(date_range.normalize())
         else:
             self.start_dt = start_dt
             self.end_dt = start_dt if not recurring else (
@@ -53,20 +62,27 @@ class CashFlow():
                 else start_dt + self.DEFAULT_END_DT_OFFSET
             )
             self.freq=freq
+            self._grid = TimeGrid.from_bounds(self.start_dt, self.end_dt, freq)
 
         self.amount = amount
-        self._initial_values = values if values is not None else (
-            [amount] * len(self.date_range)
+        # Values are kept as float64 arrays aligned w/ self._grid; pandas
+        # objects are only built on export (cash_flows_df etc.)
+        self._initial_values = (
+            np.asarray(values, dtype=float) if values is not None
+            else np.full(len(self._grid), amount, dtype=float)
         )
         self._values = self._initial_values # We may want to change values, e.g. growth in salary/expenses, but want to still have a record of original _values
+        self._nominal_values = self._values # _values before any discounting
         self._outflow = outflow
+        growth_fns = dict(growth_per_period_fn=growth_per_period_fn,
+                          growth_rate_sampler=growth_rate_sampler)
         self.growth_series = growth_series(
             start_dt=growth_start_dt or self.date_range.min(),
             end_dt=growth_end_dt or self.date_range.max(),
             freq=growth_freq or self.freq,
             min_val=min_growth,
             max_val=max_growth,
-            growth_per_period_fn=growth_per_period_fn or (lambda x: 0),
+            **{k: v for k, v in growth_fns.items() if v is not None},
             **addtl_growth_params
         )
         self._yearly_discount_rate = yearly_discount_rate
@@ -95,25 +111,16 @@ class CashFlow():
 
     @property
     def date_range(self) -> pd.date_range:
-        freq = hp.FREQ_MAP.get(self.freq, self.freq)
-        date_range = pd.date_range(
-            start=self.start_dt,
-            end=self.end_dt,
-            freq=freq,
-            normalize=True
-        )
-        return date_range
+        return self._grid.date_range
 
 
     @property
-    def days_from_start(self) -> List[int]:
+    def days_from_start(self) -> np.ndarray:
         """
-        Get self.date_range expressed as days from start_dt.
+        Get self.date_range expressed as (int64) days from start_dt.
         TO DO: Think about exposing period_resolution == '1D'
         """
-        n_periods = [(x - self.date_range.min())/pd.Timedelta('1D')
-                     for x in self.date_range]
-        return n_periods
+        return self._grid.day_offsets
 
 
     @property
@@ -129,6 +136,22 @@ class CashFlow():
         return cash_flows
 
 
+    def _as_columns(self) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        """
+        (epoch days, column names, (n_dates, n_cols) values) - the data in
+        cash_flows_df without building it, for aligning collections.
+        """
+        return self._grid.epoch_days, [self.name], self._values[:, None]
+
+
+    def _cache_key(self) -> tuple:
+        """
+        Anything _as_columns depends on that can change after init, so
+        collections holding this can tell when to recompute.
+        """
+        return ()
+
+
     def plot_cash_flows(self, cumulative: bool = True, **kwargs) -> None:
         if cumulative:
             to_plt = (
@@ -149,8 +172,9 @@ class CashFlow():
     @property
     def _local_vol_fn(self) -> Callable:
         # Should be overwritten by subclasses where applicable;
-        # Currently, returns the number itself, equivalent to no local vol
-        return lambda x: np.random.normal(x, scale=0.0)
+        # Currently, returns the number itself, equivalent to no local vol.
+        # Takes arrays, and an optional rng (np.random or a Generator).
+        return lambda x, rng=np.random: rng.normal(x, scale=0.0)
 
 
     def _get_growth_series(self) -> pd.Series:
@@ -169,11 +193,27 @@ class CashFlow():
         return aligned_growth_series
 
 
+    def _get_growth_paths(self,
+                          n_paths: int,
+                          rng: np.random.Generator
+                          ) -> np.ndarray:
+        "Growth paths from self.growth_series, padded onto self.date_range."
+        growth_paths = self.growth_series.growth_paths(n_paths, seed=rng)
+        # position of the last growth date on or before each cashflow date
+        idx = self.growth_series.date_range.searchsorted(
+            self.date_range, side='right'
+            ) - 1
+        aligned = growth_paths[:, np.clip(idx, 0, None)]
+        # observations pre-first growth date should be 0 growth
+        aligned[:, idx < 0] = 1.0
+        return aligned
+
+
     def _add_local_vol(self, series: pd.Series,
                        fn: Optional[Callable] = None
                        ) -> pd.Series:
         fn = fn if fn else self._local_vol_fn
-        return series.apply(fn)
+        return pd.Series(fn(series.values), index=series.index)
 
 
     def get_growth_path(self, return_df: bool = False) -> Optional[pd.DataFrame]:
@@ -194,24 +234,69 @@ class CashFlow():
 
         return to_return
 
+    def simulate_paths(self,
+                       n_paths: int,
+                       seed: Optional[hp.SeedLike] = None
+                       ) -> np.ndarray:
+        """
+        Simulate n_paths versions of this cashflow's values in one array
+        computation, returned as an (n_paths, n_periods) array. Growth and
+        local vol draws all come from one numpy Generator seeded by `seed`.
+        """
+        if not self._incorporate_growth:
+            return np.tile(self._values, (n_paths, 1))
+
+        rng = hp.get_rng(seed)
+        growth_paths = self._get_growth_paths(n_paths, rng)
+        growth_paths_with_vol = self._local_vol_fn(growth_paths, rng)
+        paths = self._initial_values * growth_paths_with_vol
+        if self._incorporate_discounting:
+            paths = paths * get_discount_curve(self._yearly_discount_rate).factors(self._grid)
+
+        return paths
+
+    @profiling.stage()
     def update_values_with_growth(self) -> None:
         updated_values = self.get_growth_path()
-        self._values = updated_values
+        self._nominal_values = updated_values.reindex(self.date_range).values
+        self._values = self._nominal_values
         if self._incorporate_discounting:
             self._update_values_with_discounting()
 
     def get_discounted_values(self, yearly_discount_rate: float = 0.02
                              ) -> pd.Series:
-        vals = self._values.copy()
-        n_periods = (vals.index - vals.index.min())/pd.Timedelta('1Y')
-        discount_factors = pd.Series(
-            data=[(1 + yearly_discount_rate)**x for x in n_periods],
-            index=vals.index
+        "Undiscounted values, discounted back to the start of date_range."
+        discount_factors = get_discount_curve(yearly_discount_rate).factors(self._grid)
+        discounted_vals = pd.Series(
+            self._nominal_values * discount_factors,
+            index=self.date_range
         )
-        discounted_vals = vals.divide(discount_factors)
 
         return discounted_vals
 
 
+    @profiling.stage()
     def _update_values_with_discounting(self, **kwargs) -> None:
-        self._values = self.get_discounted_values(self._yearly_discount_rate)
+        self._values = self.get_discounted_values(self._yearly_discount_rate).values
+
+
+    def _present_value_basis(self) -> np.ndarray:
+        "Undiscounted values on self._grid that present_value discounts."
+        return self._nominal_values
+
+    def present_value(self,
+                      yearly_discount_rates: Optional[RatesLike] = None,
+                      as_of: Optional[Union[str, datetime]] = None
+                      ) -> Union[float, np.ndarray]:
+        """
+        Present value of the (undiscounted) values as of `as_of` (default:
+        the first date), at self._yearly_discount_rate unless rates are
+        given. Pass an array of rates to get an array of PVs in one pass.
+        """
+        rates = (yearly_discount_rates if yearly_discount_rates is not None
+                 else self._yearly_discount_rate)
+        curve = get_discount_curve(rates)
+        pv = curve.factors(self._grid) @ np.nan_to_num(self._present_value_basis())
+        if as_of is not None and len(self._grid):
+            pv = pv * curve.shift(self._grid.start_dt, as_of)
+        return pv
@@ -0,0 +1,180 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Sequence, Tuple
+
+from gameplan.growth.data_sources import USDAData, get_usda_data
+
+YEARS_IN_HOUSEHOLD = 18
+DAYS_PER_MONTH = 365.2425 / 12
+# Per-child cost multiplier by # of children in the household (economies of
+# scale w/ multiple kids); households of 3+ use the last entry
+N_KIDS_MULTIPLIERS = np.array([0, 1.27, 1, 0.76])
+
+
+def to_epoch_months(dts: Sequence[pd.datetime]) -> np.ndarray:
+    "int64 months since 1970-01 for each date."
+    dts = pd.DatetimeIndex(dts)
+    return (dts.year.values.astype(np.int64) - 1970) * 12 + dts.month.values - 1
+
+
+def month_fractions(dts: Sequence[pd.datetime]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fraction of the month on or after each date, & of the same month up to
+    & including it, i.e. the share of a child's first & last months in the
+    household if born on (and leaving on the anniversary of) each date.
+    """
+    dts = pd.DatetimeIndex(dts)
+    days_in_month = dts.days_in_month.values
+    day = dts.day.values
+    return (days_in_month - day + 1) / days_in_month, day / days_in_month
+
+
+def from_epoch_months(start_month: int, n_months: int) -> pd.DatetimeIndex:
+    "Month-end dates for n_months months, starting at start_month."
+    start = pd.Timestamp(1970 + start_month // 12, start_month % 12 + 1, 1)
+    return pd.date_range(start=start, periods=n_months, freq='M')
+
+
+def get_n_kids_multiplier(n_kids) -> np.ndarray:
+    "Vectorized lookup of N_KIDS_MULTIPLIERS for each household size."
+    n_kids = np.asarray(n_kids)
+    return N_KIDS_MULTIPLIERS[np.clip(n_kids, 0, len(N_KIDS_MULTIPLIERS) - 1).astype(int)]
+
+
+def get_n_kids_in_household(kids_bdays: List[pd.datetime],
+                            years_in_household: int = YEARS_IN_HOUSEHOLD
+                            ) -> pd.Series:
+    """
+    # of children in the household as a step series: one entry per date the
+    count changes (a birth, or the day after a child's last in the house),
+    holding until the next entry. Built by sweeping +1/-1 events through a
+    cumsum, so its size is O(# of children), not O(# of days).
+    """
+    if len(kids_bdays) == 0:
+        today = pd.Timestamp.today().normalize()
+        return pd.Series(
+            data=0,
+            index=pd.DatetimeIndex([today, today + pd.DateOffset(years=10)]),
+            name='n_kids_in_household'
+        )
+
+    births = pd.DatetimeIndex(kids_bdays).normalize()
+    exits = pd.DatetimeIndex([
+        x + pd.DateOffset(years=years_in_household, days=1) for x in births
+    ])
+    event_dates, event_idx = np.unique(
+        np.concatenate([births.values, exits.values]), return_inverse=True
+    )
+    deltas = np.bincount(
+        event_idx,
+        weights=np.repeat([1, -1], len(births)),
+        minlength=len(event_dates)
+    )
+    index = pd.DatetimeIndex(event_dates).insert(0, births.min() - pd.DateOffset(days=1))
+    counts = np.concatenate([[0], np.cumsum(deltas)]).astype(int)
+    return pd.Series(counts, index=index, name='n_kids_in_household')
+
+
+def n_kids_on(n_kids_ts: pd.Series, dates: Sequence[pd.datetime]) -> np.ndarray:
+    "Value of the get_n_kids_in_household step series on each of dates."
+    pos = n_kids_ts.index.searchsorted(pd.DatetimeIndex(dates), side='right') - 1
+    return np.where(pos >= 0, n_kids_ts.values[np.clip(pos, 0, None)], 0)
+
+
+class ChildExpenditureCurves():
+    """
+    Monthly cost of a child in each USDA expense category, by the child's
+    age in months (0 through years_in_household years), for one (region,
+    income group) of USDAData.cleaned_data. Like the USDA table, the cost
+    at a given age is the row for the latest age bucket ending by then.
+    """
+    def __init__(self,
+                 region: str,
+                 income_group: str,
+                 data_source: Optional[USDAData] = None,
+                 years_in_household: int = YEARS_IN_HOUSEHOLD
+                 ) -> None:
+        data_source = data_source if data_source is not None else get_usda_data()
+        try:
+            data = data_source.cleaned_data[(region, income_group)]
+        except KeyError:
+            raise ValueError(f"No USDA data for ({region}, {income_group})")
+        self.region = region
+        self.income_group = income_group
+        self.categories = list(data.columns)
+        age_in_days = np.arange(years_in_household * 12 + 1) * DAYS_PER_MONTH
+        rows = np.searchsorted(data.index.values, age_in_days, side='right') - 1
+        self.curves = data.values[rows] / 12 # (n_months, n_categories)
+        self.curves.setflags(write=False)
+
+    @property
+    def n_months(self) -> int:
+        return len(self.curves)
+
+    def place(self,
+              birth_months: np.ndarray,
+              month_fractions: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+              multipliers: Optional[np.ndarray] = None
+              ) -> Tuple[int, np.ndarray]:
+        """
+        Sum each child's curve onto one monthly grid by offset indexing.
+        birth_months are epoch months (see to_epoch_months); returns the
+        grid's first epoch month & an (n_grid_months, n_categories) array.
+            * month_fractions - (first, last) month shares per child, to
+              pro-rate partial months (see month_fractions)
+            * multipliers - (n_grid_months,) scale for each month, e.g. for
+              economies of scale w/ several children
+        """
+        birth_months = np.asarray(birth_months, dtype=np.int64)
+        if not len(birth_months):
+            return 0, np.zeros((0, len(self.categories)))
+        start = birth_months.min()
+        n_grid_months = birth_months.max() - start + self.n_months
+        totals = np.zeros((n_grid_months, len(self.categories)))
+        rows = (birth_months - start)[:, None] + np.arange(self.n_months)
+        np.add.at(totals, rows, self.curves)
+        if month_fractions is not None:
+            first, last = (np.asarray(x, dtype=float) for x in month_fractions)
+            np.add.at(totals, rows[:, 0], -(1 - first)[:, None] * self.curves[0])
+            np.add.at(totals, rows[:, -1], -(1 - last)[:, None] * self.curves[-1])
+        if multipliers is not None:
+            totals *= np.asarray(multipliers, dtype=float)[:, None]
+        return start, totals
+
+
+@lru_cache(maxsize=64)
+def get_child_expenditure_curves(region: str, income_group: str
+                                 ) -> ChildExpenditureCurves:
+    "Shared ChildExpenditureCurves per (region, income group), built on first use."
+    return ChildExpenditureCurves(region, income_group)
+
+
+def get_household_expenditures(bdays: List[pd.datetime],
+                               region: str,
+                               income_group: str,
+                               economies_of_scale: bool = True
+                               ) -> pd.DataFrame:
+    """
+    Monthly expenditures by category on all children born on bdays (past
+    or future), on a month-end grid from the first birth through the last
+    child leaving the household. With economies_of_scale, each month is
+    scaled by get_n_kids_multiplier for the # of children at month end.
+    """
+    curves = get_child_expenditure_curves(region, income_group)
+    birth_months = to_epoch_months(bdays)
+    multipliers = None
+    if economies_of_scale and len(bdays):
+        start = birth_months.min()
+        month_ends = from_epoch_months(
+            start, birth_months.max() - start + curves.n_months
+        )
+        n_kids = n_kids_on(get_n_kids_in_household(bdays), month_ends)
+        multipliers = get_n_kids_multiplier(n_kids)
+    start, totals = curves.place(birth_months, month_fractions(bdays),
+                                 multipliers)
+    return pd.DataFrame(
+        totals,
+        index=from_epoch_months(start, len(totals)),
+        columns=curves.categories,
+    )
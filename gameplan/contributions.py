@@ -1,8 +1,62 @@
 import pandas as pd
 import numpy as np
+from typing import Optional, Union
 
 from gameplan.cashflows import CashFlow
 from gameplan.gp_collections import CashFlowCollection
+from gameplan import profiling
+from gameplan.time_grid import get_bucket_indices
+
+
+@profiling.stage()
+def get_capped_amounts(values: np.ndarray,
+                       date_range: pd.DatetimeIndex,
+                       pct: Union[float, np.ndarray] = 1.0,
+                       max_amt: Optional[float] = None,
+                       max_amt_freq: Optional[str] = None
+                       ) -> np.ndarray:
+    """
+    pct * values, with the running total within each max_amt_freq period
+    (e.g. 'Y' for calendar years) capped at max_amt - i.e. contributions
+    stop once the period-to-date limit is hit, & restart next period.
+
+    pct may be an array of rates, in which case one row is returned per
+    rate (n_rates, len(values)), computed together w/ grouped cumsums.
+    """
+    values = np.asarray(values, dtype=float)
+    pcts = np.asarray(pct, dtype=float)
+    amounts = pcts[..., None] * values
+    if not any([max_amt, max_amt_freq]):
+        return amounts
+    if not all([max_amt, max_amt_freq]):
+        raise ValueError("Need either both or neither of max_amt params to be None.")
+
+    _, period = get_bucket_indices(date_range, max_amt_freq)
+    is_start = np.diff(period, prepend=-1) != 0
+    starts = np.flatnonzero(is_start)
+    group = np.cumsum(is_start) - 1
+    cum_amounts = np.cumsum(amounts, axis=-1)
+    # running total before each period began, so every period restarts at 0
+    carried = np.take(cum_amounts - amounts, starts, axis=-1)
+    period_to_date = np.minimum(cum_amounts - carried[..., group], max_amt)
+    capped = np.diff(period_to_date, axis=-1, prepend=0)
+    capped[..., starts] = period_to_date[..., starts]
+
+    return capped
+
+
+def _values_from_income_stream(income_stream, pct, max_amt, max_amt_freq):
+    if np.ndim(pct):
+        # one cash flow holds one row of values
+        raise ValueError("pct must be a scalar here; use get_capped_amounts "
+                         "to compute amounts for an array of rates.")
+    return get_capped_amounts(
+        income_stream._values,
+        income_stream.date_range,
+        pct=pct,
+        max_amt=max_amt,
+        max_amt_freq=max_amt_freq,
+    )
 
 
 class Contribution(CashFlow):
@@ -26,30 +80,14 @@ class Contribution(CashFlow):
     @classmethod
     def from_income_stream(cls, income_stream, pct=1.0, label=None,
                            max_amt=None, max_amt_freq=None):
+        values = _values_from_income_stream(income_stream, pct, max_amt,
+                                            max_amt_freq)
         label = (
             label if label is not None
             else f"{pct:.0%} Contribution from {income_stream.name}"
         )
-        date_range = income_stream.date_range
-        # Need to consolidate w/ deduction logic, below; exact same
-        if not any([max_amt, max_amt_freq]):
-            values = [ pct * x for x in income_stream._values ]
-        elif all([max_amt, max_amt_freq]):
-            n_pay_periods = income_stream.salary_df.resample(
-                max_amt_freq,
-                label='left',
-                loffset='d'
-                ).count()
-            cap = pd.Series(index=n_pay_periods.index, data=max_amt)
-            max_amt_series = pd.Series(cap / n_pay_periods.iloc[:, 0])
-            max_amt_series= max_amt_series.reindex(date_range, method='ffill')
-            zipped = zip(income_stream._values, max_amt_series.values)
-            values = [ min(pct * x, y) for x, y in zipped ]
-        else:
-            raise ValueError("Need either both or neither of max_amt params to be None.")
-
-        return cls(contribution_label=label, date_range=date_range,
-                   values=values)
+        return cls(contribution_label=label,
+                   date_range=income_stream.date_range, values=values)
 
 
 class Deduction(CashFlow):
@@ -73,30 +111,14 @@ class Deduction(CashFlow):
     @classmethod
     def from_income_stream(cls, income_stream, pct=1.0, label=None,
                            max_amt=None, max_amt_freq=None):
+        values = _values_from_income_stream(income_stream, pct, max_amt,
+                                            max_amt_freq)
         label = (
             label if label is not None
             else f"{pct:.0%} Deduction from {income_stream.name}"
         )
-        date_range = income_stream.date_range
-        # Need to consolidate w/ contribution logic, above; exact same
-        if not any([max_amt, max_amt_freq]):
-            values = [ pct * x for x in income_stream._values ]
-        elif all([max_amt, max_amt_freq]):
-            n_pay_periods = income_stream.salary_df.resample(
-                max_amt_freq,
-                label='left',
-                loffset='d'
-                ).count()
-            cap = pd.Series(index=n_pay_periods.index, data=max_amt)
-            max_amt_series = pd.Series(cap / n_pay_periods.iloc[:, 0])
-            max_amt_series= max_amt_series.reindex(date_range, method='ffill')
-            zipped = zip(income_stream._values, max_amt_series.values)
-            values = [ min(pct * x, y) for x, y in zipped ]
-        else:
-            raise ValueError("Need either both or neither of max_amt params to be None.")
-
-        return cls(deduction_label=label, date_range=date_range,
-                   values=values)
+        return cls(deduction_label=label,
+                   date_range=income_stream.date_range, values=values)
 
 
 class Contributions(CashFlowCollection):
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from functools import lru_cache
+import threading
+import numpy as np
+from typing import Sequence, Union
+
+from gameplan.time_grid import TimeGrid, to_epoch_days
+
+DAYS_PER_YEAR = 365.2425
+
+RatesLike = Union[float, Sequence[float], np.ndarray]
+
+
+class DiscountCurve():
+    """
+    Discount factors 1 / (1 + r)**years for one or many yearly rates r.
+    Factors are cached per TimeGrid (grids are shared, see get_time_grid),
+    so cash flows on the same grid & rate reuse one array. With an array of
+    rates every result gains a leading (n_rates,) axis, e.g. for a PV sweep.
+    """
+    def __init__(self, yearly_rates: RatesLike = 0.02, maxsize: int = 64) -> None:
+        self.yearly_rates = np.asarray(yearly_rates, dtype=float)
+        self.maxsize = maxsize
+        self._factors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def factors_for_days(self, days: np.ndarray) -> np.ndarray:
+        "Discount factors for cash flows `days` (may be negative) out."
+        n_years = np.asarray(days, dtype=float) / DAYS_PER_YEAR
+        return (1 + self.yearly_rates[..., None])**-n_years
+
+    def factors(self, grid: TimeGrid) -> np.ndarray:
+        "Read-only factors for grid.day_offsets, i.e. discounted to grid start."
+        with self._lock:
+            if grid in self._factors:
+                self._factors.move_to_end(grid)
+                return self._factors[grid]
+        factors = self.factors_for_days(grid.day_offsets)
+        factors.setflags(write=False)
+        with self._lock:
+            self._factors[grid] = factors
+            while len(self._factors) > self.maxsize:
+                self._factors.popitem(last=False)
+        return factors
+
+    def shift(self, start_dt, as_of) -> np.ndarray:
+        "Factor(s) that move values discounted to start_dt back to as_of."
+        days = to_epoch_days([start_dt])[0] - to_epoch_days([as_of])[0]
+        return self.factors_for_days(np.array([days]))[..., 0]
+
+
+@lru_cache(maxsize=32)
+def _get_discount_curve(shape: tuple, yearly_rates: tuple) -> DiscountCurve:
+    return DiscountCurve(np.array(yearly_rates).reshape(shape))
+
+
+def get_discount_curve(yearly_rates: RatesLike = 0.02) -> DiscountCurve:
+    "The shared DiscountCurve for yearly_rates (a float or array of rates)."
+    rates = np.asarray(yearly_rates, dtype=float)
+    return _get_discount_curve(rates.shape, tuple(rates.ravel().tolist()))
@@ -24,6 +24,7 @@ class Expense(CashFlow):
                  growth_start_dt: Optional[Union[str, datetime]] = None,
                  growth_end_dt: Optional[Union[str, datetime]] = None,
                  growth_per_period_fn: Optional[Callable] = None,
+                 growth_rate_sampler: Optional[Callable] = None,
                  incorporate_growth: bool = True,
                  incorporate_discounting: bool = True,
                  yearly_discount_rate: float = 0.02,
@@ -44,6 +45,7 @@ class Expense(CashFlow):
             outflow=True,
             growth_series = growth_series,
             growth_per_period_fn=growth_per_period_fn,
+            growth_rate_sampler=growth_rate_sampler,
             growth_freq=growth_freq,
             min_growth=min_growth,
             max_growth=max_growth,
@@ -61,7 +63,7 @@ class Expense(CashFlow):
     @property
     def _local_vol_fn(self):
         # Normal dist w/ std as % of mean value, based on self._local_vol
-        return lambda x: np.random.normal(x, scale=x*self._local_vol)
+        return lambda x, rng=np.random: rng.normal(x, scale=x*self._local_vol)
 
 
 class Rent(Expense):
@@ -0,0 +1,144 @@
+"""
+Goal seeking on Portfolios, e.g. the most rent, or the largest 401k %,
+that keeps cash savings non-negative.
+
+Each solver varies one input of an existing Portfolio in place & re-reads
+a metric of it. Only what depends on that input is rebuilt between
+evaluations: salary growth, growth curve fits & asset return paths stay
+cached, & cash savings re-derives only when its inputs' versions change.
+"""
+from typing import Callable, NamedTuple, Optional
+import warnings
+
+from gameplan.expenses import Expense
+from gameplan.scenarios import min_cash_savings
+
+
+class GoalSeekResult(NamedTuple):
+    value: float      # the solution, on the feasible side of the boundary
+    metric: float     # the metric at value
+    n_evals: int
+    converged: bool   # False if max_iter ran out before tol was reached
+
+
+def bisect(fn: Callable[[float], float],
+           lo: float,
+           hi: float,
+           target: float = 0.0,
+           tol: float = 1e-4,
+           max_iter: int = 60,
+           increasing: Optional[bool] = None
+           ) -> GoalSeekResult:
+    """
+    Boundary of {x in [lo, hi]: fn(x) >= target} for a monotone fn, to
+    within tol: the smallest such x if fn increases, the largest if it
+    decreases. increasing defaults to comparing fn(lo) & fn(hi), which
+    can't tell a flat fn apart, so pass it where that matters. Raises
+    ValueError if no x in [lo, hi] reaches target.
+    """
+    f_lo, f_hi = fn(lo), fn(hi)
+    n_evals = 2
+    increasing = increasing if increasing is not None else f_hi >= f_lo
+    if f_lo >= target and f_hi >= target:
+        best = (lo, f_lo) if increasing else (hi, f_hi)
+        return GoalSeekResult(*best, n_evals, True)
+    if f_lo < target and f_hi < target:
+        raise ValueError(
+            f"target {target} isn't reached anywhere in [{lo}, {hi}] "
+            f"(metric is {f_lo} at {lo} & {f_hi} at {hi})"
+        )
+    # keep `good` on the feasible side & `bad` on the other
+    (good, f_good), bad = ((lo, f_lo), hi) if f_lo >= target else ((hi, f_hi), lo)
+    while abs(good - bad) > tol and n_evals < max_iter:
+        mid = (good + bad) / 2
+        f_mid = fn(mid)
+        n_evals += 1
+        if f_mid >= target:
+            good, f_good = mid, f_mid
+        else:
+            bad = mid
+    return GoalSeekResult(good, f_good, n_evals, abs(good - bad) <= tol)
+
+
+def solve_401k_contribution_pct(portfolio,
+                                income_stream_label: str = 'salary',
+                                employer_match: Optional[dict] = None,
+                                metric: Callable = min_cash_savings,
+                                target: float = 0.0,
+                                lo: float = 0.0,
+                                hi: float = 1.0,
+                                tol: float = 1e-4,
+                                label: str = '401k',
+                                increasing: Optional[bool] = None
+                                ) -> GoalSeekResult:
+    """
+    401k contribution % at the edge of metric(portfolio) >= target, e.g.
+    the largest % that keeps cash savings >= 0 (the defaults), or w/
+    metric=final_401k_balance the smallest % that reaches a balance.
+    Leaves portfolio set up w/ the solution.
+    """
+    def evaluate(pct: float) -> float:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore') # overwrite warnings
+            if pct > 0:
+                portfolio.add_401k_contribution(income_stream_label, pct,
+                                                employer_match=employer_match,
+                                                label=label,
+                                                if_exists='overwrite')
+            else:
+                portfolio.remove_401k_contribution(income_stream_label, label)
+        return metric(portfolio)
+
+    result = bisect(evaluate, lo, hi, target, tol, increasing=increasing)
+    evaluate(result.value)
+    return result
+
+
+def scaled_expense(expense: Expense, amount: float) -> Expense:
+    """
+    Copy of expense w/ every value scaled so its first period is amount,
+    i.e. the same growth & timing at a different budget.
+    """
+    return Expense(expense_type=expense.name,
+                   date_range=expense.date_range,
+                   values=expense._values * (amount / expense.amount),
+                   amount=amount,
+                   incorporate_growth=False,
+                   incorporate_discounting=False,
+                   pretax=expense.pretax)
+
+
+def solve_expense_budget(portfolio,
+                         label: str = 'rent',
+                         metric: Callable = min_cash_savings,
+                         target: float = 0.0,
+                         lo: float = 0.0,
+                         hi: Optional[float] = None,
+                         tol: float = 1.0,
+                         increasing: Optional[bool] = None
+                         ) -> GoalSeekResult:
+    """
+    Budget (first period amount) for the expense at label at the edge of
+    metric(portfolio) >= target, e.g. the most rent that keeps cash savings
+    >= 0 (the defaults). hi defaults to 10x the current amount. The
+    expense's growth path is kept & rescaled, see scaled_expense. Leaves
+    portfolio set up w/ the solution.
+    """
+    base = portfolio.expenses.contents[label]
+    if not base.amount:
+        raise ValueError(f"{label} needs a non-zero amount to scale")
+    hi = hi if hi is not None else 10 * base.amount
+
+    def evaluate(amount: float) -> float:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore') # overwrite warnings
+            if amount > 0:
+                portfolio.add_expense(scaled_expense(base, amount), label,
+                                      if_exists='overwrite')
+            else:
+                portfolio.remove_expense(label)
+        return metric(portfolio)
+
+    result = bisect(evaluate, lo, hi, target, tol, increasing=increasing)
+    evaluate(result.value)
+    return result
@@ -3,8 +3,10 @@ import numpy as np
 import warnings
 
 import gameplan.helpers as hp
+from gameplan import profiling
 # from gameplan.assets import Asset
 from gameplan.cashflows import CashFlow
+from gameplan.time_grid import AlignedCashFlows
 # from gameplan.contributions import Contribution
 # from gameplan.income_streams import IncomeStream
 # from gameplan.expenses import Expense
@@ -15,7 +17,8 @@ class Collection():
         self.collection_type = collection_type
         if [x for x in objects.values() if not isinstance(x, collection_type)]:
             raise ValueError(f"All objects must be of type {collection_type}")
-        self.contents = objects
+        self.contents = dict(objects) # don't alias the caller's (or a default) dict
+        self.version = 0 # bumped on every change, used to invalidate caches
 
 
     @property
@@ -45,11 +48,13 @@ class Collection():
                 raise ValueError(error_message)
 
         self.contents[label] = object
+        self.version += 1
 
 
     def remove_object(self, label, verbose=True):
         if label in self.contents:
             del self.contents[label]
+            self.version += 1
         elif verbose:
             warnings.warn(f"No object w/ label '{label}' exists.")
 
@@ -83,40 +88,83 @@ class CashFlowCollection(Collection):
     def outflows(self):
         return {k: v for k,v in self.contents.items() if v._outflow}
 
+    def _cache_key(self):
+        "Changes whenever membership or any member's cash flows do."
+        return (self.version,
+                tuple(x._cache_key() for x in self.contents.values()))
+
     @property
+    @hp.cached_until_changed(lambda self: self._cache_key())
     def as_df(self):
         return self._get_totals_df()
 
+    @property
+    @hp.cached_until_changed(lambda self: self._cache_key())
+    @profiling.stage()
+    def _aligned(self):
+        "Members' cash flows on their common day grid, see AlignedCashFlows."
+        if not self.contents:
+            return None
+        inflows = [x._as_columns() for x in self.inflows.values()]
+        outflows = [
+            (days, cols, -values)
+            for days, cols, values in (x._as_columns() for x in self.outflows.values())
+        ]
+        return AlignedCashFlows(inflows + outflows)
+
     def agg_cash_flows(self, freq):
-        return self.as_df.resample(freq).sum()
+        aligned = self._aligned
+        if aligned is None:
+            return None
+        labels, agg = aligned.aggregate(freq)
+        df = pd.DataFrame(agg, index=labels, columns=aligned.columns)
+        df[self.totals_col_label] = agg.sum(axis=1)
+        return df
 
     @property
     def total(self):
-        return getattr(self.as_df, self.totals_col_label, None)
+        aligned = self._aligned
+        if aligned is None:
+            return None
+        return pd.Series(aligned.totals, index=aligned.date_index,
+                         name=self.totals_col_label)
 
 
+    @profiling.stage()
     def get_total_as_cashflow(self, freq, name=None):
-        if pd.Series(self.total).empty:
+        aligned = self._aligned
+        if aligned is None or not len(aligned.days):
             return None
-        total = self.total.resample(freq).sum()
+        labels, total = aligned.aggregate(freq, aligned.totals)
         label = name if name else self.totals_col_label
         cf = CashFlow(
                 cashflow_type=self.collection_type,
                 name=label,
-                date_range=total.index,
-                values=total.values
+                date_range=labels,
+                values=total
                 )
         return cf
 
+    def present_value(self, yearly_discount_rates=0.02, as_of=None):
+        """
+        Sum of members' present_value (outflows negative), all discounted to
+        as_of (default: the earliest member date). yearly_discount_rates may
+        be an array of rates, returning one PV per rate.
+        """
+        if not self.contents:
+            return None
+        if as_of is None:
+            as_of = min(x.date_range.min() for x in self.contents.values()
+                        if len(x.date_range))
+        pvs = [
+            (-1 if x._outflow else 1) * x.present_value(yearly_discount_rates, as_of)
+            for x in self.contents.values()
+        ]
+        return sum(pvs)
+
     def _get_totals_df(self, warn=True):
         "Each collection subclass should use this to create a totals_df property."
         if not self.contents:
             if warn: warnings.warn('This Collection is empty.')
             return None
-        inflows = [x.cash_flows_df for x in self.inflows.values()]
-        outflows = [-x.cash_flows_df for x in self.outflows.values()]
-        df = pd.concat(inflows + outflows, axis=1).fillna(0)
-        totals_col_label = self.totals_col_label
-        df[totals_col_label] = df.sum(axis=1)
-
-        return df
+        return self._aligned.to_df(self.totals_col_label)
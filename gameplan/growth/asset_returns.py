@@ -1,7 +1,16 @@
+from functools import lru_cache
+import numpy as np
 import pandas as pd
-from typing import Dict, List
+from typing import Dict, List, Optional
+import warnings
 
-import fecon236.prob.sim as fe_sim
+import gameplan.helpers as hp
+
+
+def _get_fe_sim():
+    # fecon236 drags in statsmodels & sympy, so only import it once needed
+    import fecon236.prob.sim as fe_sim
+    return fe_sim
 
 
 class AssetReturns():
@@ -11,41 +20,88 @@ class AssetReturns():
         self.cash_savings = {}
 
 
-    def add_ticker(self, asset_type, ticker):
+    def add_ticker(self, asset_type, ticker, n_paths=1):
         asset_class = getattr(self, asset_type)
         if asset_class.get(ticker):
             warnings.warn(f"{ticker} already populated, not overwriting")
         else:
             if asset_type == 'equity':
                 # I'm not passing mu & sigma here, not sure if that's right
-                asset_class[ticker] = EquityReturnsSeries(symbol=ticker)
+                asset_class[ticker] = EquityReturnsSeries(symbol=ticker,
+                                                          n_paths=n_paths)
             else:
                 raise NotImplementedError(f"Haven't implemented subclass for {asset_type}")
 
         return asset_class[ticker]
 
-    def get_returns_series(self, asset_type, ticker):
+    def get_returns_series(self, asset_type, ticker, n_paths=1):
         asset_class = getattr(self, asset_type, None)
-        series = asset_class.get(ticker) or self.add_ticker(asset_type, ticker)
+        series = asset_class.get(ticker) or self.add_ticker(asset_type, ticker,
+                                                            n_paths)
+        series.ensure_n_paths(n_paths)
         return series
 
 
+@lru_cache(maxsize=None)
+def get_asset_returns():
+    "Process-wide AssetReturns, created on first use."
+    return AssetReturns()
+
+
 class EquityReturnsSeries():
-    DEFAULT_MU = fe_sim.SPXmean
-    DEFAULT_SIGMA = fe_sim.SPXsigma
-    DEFAULT_DATE_RANGE = pd.date_range(
-        start=pd.datetime.today().date(),
-        end=pd.datetime(2100, 1, 1),
-        freq='B'
-    )
-
-    def __init__(self, symbol, date_range=DEFAULT_DATE_RANGE, mu=DEFAULT_MU, sigma=DEFAULT_SIGMA):
+    """
+    Simulated daily returns for a ticker, shared by every asset on it. At
+    most MAX_SHARED_PATHS paths are kept (in a buffer grown geometrically),
+    so one many-path asset doesn't pin a huge matrix for the life of the
+    process; assets wanting more draw their own extra paths, see
+    generate_return_paths & Equity.
+    """
+    DEFAULT_END_DT = pd.Timestamp(2100, 1, 1)
+    DEFAULT_FREQ = 'B'
+    PERIODS_PER_YEAR = 256 # fecon236's convention for daily returns
+    MAX_SHARED_PATHS = 100
+
+    def __init__(self, symbol, date_range=None, mu=None, sigma=None,
+                 n_paths=1, seed=None):
+        fe_sim = _get_fe_sim()
         self.symbol = symbol
-        self.date_range = date_range
-        self.mu = mu
-        self.sigma = sigma
-        self.returns_df = pd.DataFrame(index=date_range)
-        self.add_series_to_returns_df()
+        self.date_range = (
+            date_range if date_range is not None
+            else hp.get_default_date_range(self.DEFAULT_FREQ,
+                                           end=self.DEFAULT_END_DT)
+        )
+        self.mu = mu if mu is not None else fe_sim.SPXmean
+        self.sigma = sigma if sigma is not None else fe_sim.SPXsigma
+        self._rng = hp.get_rng(seed)
+        # One row per simulated path, one column per date in date_range;
+        # rows past _n_paths are spare capacity
+        self._paths = np.empty((0, len(self.date_range)))
+        self._n_paths = 0
+        self.ensure_n_paths(n_paths)
+
+    @property
+    def returns_matrix(self) -> np.ndarray:
+        return self._paths[:self._n_paths]
+
+    @property
+    def n_paths(self) -> int:
+        return self._n_paths
+
+    @staticmethod
+    def get_path_labels(n_paths: int) -> List[str]:
+        return [f'sim_{i + 1}' for i in range(n_paths)]
+
+    @property
+    def path_labels(self) -> List[str]:
+        return self.get_path_labels(self.n_paths)
+
+    @property
+    def returns_df(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            data=self.returns_matrix.T,
+            index=self.date_range,
+            columns=self.path_labels
+        )
 
     def _get_model_params(self) -> Dict[str, float]:
         # TO DO: make ticker specific, e.g. mu, sigma = lookup_mu_sigma(ticker=self.symbol)
@@ -58,16 +114,62 @@ class EquityReturnsSeries():
         return model_params
 
     def model(self, n_obs, mu, sigma) -> List[float]:
-        return fe_sim.gmix2ret(N=n_obs, mean=mu, sigma=sigma)
+        return _get_fe_sim().gmix2ret(N=n_obs, mean=mu, sigma=sigma)
+
+    def model_paths(self, n_paths, n_obs, mu, sigma, rng=None) -> np.ndarray:
+        """
+        Vectorized version of self.model: fecon236's GM(2) gaussian mixture
+        returns, drawn for n_paths paths at once as an (n_paths, n_obs) array
+        from rng (default: this series' own Generator).
+        """
+        fe_sim = _get_fe_sim()
+        rng = rng if rng is not None else self._rng
+        yearly = self.PERIODS_PER_YEAR
+        size = (n_paths, n_obs)
+        sigma1 = fe_sim.SPXsigma1 / (yearly ** 0.5)
+        sigma2 = fe_sim.SPXsigma2 / (yearly ** 0.5)
+        from_second_gaussian = rng.uniform(size=size) <= fe_sim.SPXq
+        gmarr = np.where(
+            from_second_gaussian,
+            rng.normal(scale=sigma2, size=size),
+            rng.normal(scale=sigma1, size=size)
+        )
+        # Rescale the normalized mixture rates by sigma, as in fe_sim.norat2ret
+        return (1 + mu / yearly) + (sigma / fe_sim.SPXsigma) * gmarr
 
     def generate_returns(self) -> List[float]:
         model_params = getattr(self, 'model_params', self._get_model_params())
         return self.model(**model_params)
 
+    def generate_return_paths(self, n_paths, n_obs=None, rng=None) -> np.ndarray:
+        "New (n_paths, n_obs) returns, by default over all of date_range."
+        model_params = dict(getattr(self, 'model_params', self._get_model_params()))
+        if n_obs is not None:
+            model_params['n_obs'] = n_obs
+        return self.model_paths(n_paths=n_paths, rng=rng, **model_params)
+
+    def add_paths(self, n_paths):
+        n_total = self._n_paths + n_paths
+        if n_total > len(self._paths):
+            # grow geometrically (up to the shared cap) so repeated calls
+            # don't copy the whole matrix each time
+            capacity = max(n_total, 2 * len(self._paths))
+            if n_total <= self.MAX_SHARED_PATHS:
+                capacity = min(capacity, self.MAX_SHARED_PATHS)
+            paths = np.empty((capacity, len(self.date_range)))
+            paths[:self._n_paths] = self.returns_matrix
+            self._paths = paths
+        self._paths[self._n_paths:n_total] = self.generate_return_paths(n_paths)
+        self._n_paths = n_total
+
+    def ensure_n_paths(self, n_paths):
+        "Have min(n_paths, MAX_SHARED_PATHS) shared paths."
+        n_paths = min(n_paths, self.MAX_SHARED_PATHS)
+        if n_paths > self.n_paths:
+            self.add_paths(n_paths - self.n_paths)
+
     def add_series_to_returns_df(self):
-        n_existing_series = len(self.returns_df.columns)
-        new_series_name = f'sim_{n_existing_series + 1}'
-        self.returns_df[new_series_name] = self.generate_returns()
+        self.add_paths(1)
 
 
 
@@ -1,3 +1,4 @@
+from functools import lru_cache
 import pandas as pd
 
 INPUT_DIR = 'gameplan/growth/raw_data/'
@@ -58,3 +59,15 @@ class USDAData():
         growth_curves = df.divide(df.loc[0])
 
         return growth_curves
+
+
+@lru_cache(maxsize=None)
+def get_kitces_data():
+    "Shared KitcesData, read from disk on first use."
+    return KitcesData()
+
+
+@lru_cache(maxsize=None)
+def get_usda_data():
+    "Shared USDAData, read from disk on first use."
+    return USDAData()
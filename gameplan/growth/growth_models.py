@@ -1,37 +1,125 @@
+from functools import lru_cache
 import numpy as np
 import pandas as pd
+from typing import List, Optional, Sequence, Tuple
 
-from gameplan.growth.data_sources import KitcesData
+from gameplan.growth.data_sources import KitcesData, get_kitces_data
+
+
+class KitcesGrowthCurves():
+    """
+    Polynomial fits of every income percentile column in
+    KitcesData.cleaned_data, solved together as one least-squares problem
+    w/ a right-hand side per percentile. Fits match Polynomial.fit (ages are
+    scaled from their domain onto [-1, 1]), and the coefficient table is
+    shared via get_kitces_growth_curves.
+    """
+    WINDOW = np.array([-1.0, 1.0])
+
+    def __init__(self, data_source: KitcesData, degree: int = 3) -> None:
+        data = data_source.cleaned_data.sort_index()
+        self.degree = degree
+        self.ages = data.index.values.astype(float)
+        self.levels = data.values.astype(float)
+        self.percentiles = [int(x) for x in data.columns]
+        self._col = {p: i for i, p in enumerate(self.percentiles)}
+        self.domain = np.array([self.ages.min(), self.ages.max()])
+        coefs = np.polynomial.polynomial.polyfit(
+            self._scale(self.ages), self.levels, deg=degree
+        )
+        self.coef_table = pd.DataFrame(coefs, columns=self.percentiles)
+        self.coef_table.index.name = 'power'
+        self._polynomials = {}
+
+    def _scale(self, ages) -> np.ndarray:
+        "Map ages (in days) from self.domain onto the [-1, 1] fit window."
+        off, scl = np.polynomial.polyutils.mapparms(self.domain, self.WINDOW)
+        return off + scl * np.asarray(ages, dtype=float)
+
+    def column_index(self, percentiles) -> np.ndarray:
+        try:
+            return np.array([self._col[int(p)] for p in np.atleast_1d(percentiles)])
+        except KeyError:
+            raise ValueError(f"income_percentile must be one of: {self.percentiles}")
+
+    def polynomial(self, percentile: int) -> np.polynomial.polynomial.Polynomial:
+        "The percentile's fitted curve, built once & shared after that."
+        col = self.percentiles[self.column_index(percentile)[0]]
+        if col not in self._polynomials:
+            self._polynomials[col] = np.polynomial.polynomial.Polynomial(
+                self.coef_table[col].values,
+                domain=self.domain,
+                window=self.WINDOW,
+            )
+        return self._polynomials[col]
+
+    def evaluate(self, ages, percentiles) -> np.ndarray:
+        "Fitted levels for each (age, percentile) pair, as one matrix product."
+        powers = np.vander(self._scale(ages), self.degree + 1, increasing=True)
+        coefs = self.coef_table.values[:, self.column_index(percentiles)]
+        return np.einsum('ij,ji->i', powers, coefs)
+
+    def growth_points_to_fit(self,
+                             percentiles: Sequence[int],
+                             start_ages: Sequence[int]
+                             ) -> List[List[Tuple[int, float]]]:
+        """
+        For each (percentile, start age in days) pair, the data points from
+        start age on, as (days from start age, growth relative to the fitted
+        level at start age) - see KitcesIncomeGrowthModel.get_growth_points_to_fit.
+        """
+        start_ages = np.asarray(start_ages)
+        cols = self.column_index(percentiles)
+        ref_levels = self.evaluate(start_ages, percentiles)
+        relative = self.levels[:, cols] / ref_levels
+        ages = self.ages.astype(start_ages.dtype)
+        return [
+            [(0, 1.0)] + list(zip(
+                (ages[after] - start_age).tolist(),
+                relative[after, i].tolist()
+            ))
+            for i, (start_age, after) in enumerate(
+                (a, ages > a) for a in start_ages
+            )
+        ]
+
+
+@lru_cache(maxsize=8)
+def get_kitces_growth_curves(data_source: KitcesData, degree: int = 3
+                             ) -> KitcesGrowthCurves:
+    "Shared KitcesGrowthCurves per (data source, degree), fit on first use."
+    return KitcesGrowthCurves(data_source, degree)
 
 
 class KitcesIncomeGrowthModel():
     def __init__(self,
                  user_birthday: pd.datetime,
-                 data_source: KitcesData = KitcesData(),
+                 data_source: Optional[KitcesData] = None,
                  income_percentile: int = 50,
                  degree_poly_to_fit: int = 3,
                 ) -> None:
         self.user_birthday = user_birthday
-        self.data_source = data_source
-        self._income_percentile = income_percentile
-        self.growth_series = self._get_relevant_series()
+        self.data_source = (data_source if data_source is not None
+                            else get_kitces_data())
         self._degree_poly_to_fit = degree_poly_to_fit
-        self.fitted_polynomial = self._fit_polynomial(
-            poly_degree=self._degree_poly_to_fit
-            )
+        self.curves = get_kitces_growth_curves(self.data_source,
+                                               self._degree_poly_to_fit)
+        self.income_percentile = income_percentile
 
     def get_growth_points_to_fit(self,
                                  start_dt: pd.datetime = pd.datetime.today(),
                                  ) -> pd.Series:
-        age_at_ref_date = (start_dt - self.user_birthday).days
-        growth_level_at_ref_date = self.fitted_polynomial(age_at_ref_date)
-        new_growth_series = self.growth_series.loc[age_at_ref_date:]
-        new_growth_series.loc[age_at_ref_date] = growth_level_at_ref_date
-        new_growth_series = new_growth_series.divide(growth_level_at_ref_date)
-        new_growth_series.index = new_growth_series.index - age_at_ref_date
-        new_growth_series.sort_index(inplace=True)
+        return self.get_growth_points_to_fit_batch(
+            [self.income_percentile], [start_dt]
+        )[0]
 
-        return list(zip(new_growth_series.index, new_growth_series.values))
+    def get_growth_points_to_fit_batch(self,
+                                       percentiles: Sequence[int],
+                                       start_dts: Sequence[pd.datetime]
+                                       ) -> List[List[Tuple[int, float]]]:
+        "get_growth_points_to_fit for many (percentile, start_dt) pairs at once."
+        start_ages = [(dt - self.user_birthday).days for dt in start_dts]
+        return self.curves.growth_points_to_fit(percentiles, start_ages)
 
     @property
     def income_percentile(self) -> int:
@@ -39,14 +127,16 @@ class KitcesIncomeGrowthModel():
 
     @income_percentile.setter
     def income_percentile(self, val: int) -> None:
-        valid_vals = self.data_source.cleaned_data.columns
-        if val not in valid_vals:
-            raise ValueError(f"income_percentile must be one of: {valid_vals}")
+        self.curves.column_index(val) # validates val
         self._income_percentile = val
-        self.growth_series = self._get_relevant_series()
-        self.fitted_polynomial = self._fit_polynomial(
-            poly_degree=self._degree_poly_to_fit
-            )
+
+    @property
+    def growth_series(self) -> pd.Series:
+        return self._get_relevant_series()
+
+    @property
+    def fitted_polynomial(self) -> np.polynomial.polynomial.Polynomial:
+        return self._fit_polynomial(poly_degree=self._degree_poly_to_fit)
 
     def _get_relevant_series(self) -> pd.Series:
         relevant_col = self.income_percentile
@@ -55,7 +145,6 @@ class KitcesIncomeGrowthModel():
     def _fit_polynomial(self,
                         poly_degree: int = 3
                         ) -> np.polynomial.polynomial.Polynomial:
-        xs = self.growth_series.index
-        ys= self.growth_series.values
-        fitted_poly = np.polynomial.polynomial.Polynomial.fit(xs, ys, deg=poly_degree)
-        return fitted_poly
+        "Look up the percentile's fit in the shared coefficient table."
+        curves = get_kitces_growth_curves(self.data_source, poly_degree)
+        return curves.polynomial(self.income_percentile)
@@ -1,12 +1,87 @@
+from collections import OrderedDict
+import threading
 import numpy as np
 import pandas as pd
 from scipy import optimize
-from typing import Callable, Optional, List, Tuple
+from typing import Callable, Dict, Hashable, Optional, List, Tuple
 import warnings
 
 import gameplan.helpers as hp
+from gameplan import profiling
+from gameplan.time_grid import TimeGrid
 from gameplan.growth.growth_funcs import exponential_fn, linear_fn, logistic_fn
 
+
+def _freeze(obj) -> Hashable:
+    "Recursively convert lists/arrays of fit inputs into hashable tuples."
+    if isinstance(obj, np.ndarray):
+        obj = obj.tolist()
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(x) for x in obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+class FitCache():
+    """
+    Process-wide LRU cache of fitted growth curve parameters, keyed by the
+    content of the fit (growth fn, points, bounds, initial guesses) so that
+    identical Rent/Salary/etc. definitions skip curve_fit & Polynomial.fit.
+    """
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> Hashable:
+        return _freeze(parts)
+
+    def get_or_fit(self, key: Hashable, fit_fn: Callable):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        fitted = fit_fn()  # fit outside the lock, curve_fit can be slow
+        with self._lock:
+            self._entries[key] = fitted
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return fitted
+
+    def export(self) -> Dict[Hashable, object]:
+        "Snapshot of the cached fits, e.g. to seed another process' cache."
+        with self._lock:
+            return dict(self._entries)
+
+    def load(self, entries: Dict[Hashable, object]) -> None:
+        "Add fits from export(), keeping any already cached here."
+        with self._lock:
+            for key, fitted in entries.items():
+                self._entries.setdefault(key, fitted)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        return dict(hits=self.hits, misses=self.misses,
+                    maxsize=self.maxsize, currsize=len(self._entries))
+
+
+FIT_CACHE = FitCache()
+
+
 class GrowthSeries():
     DEFAULT_END_DT_OFFSET = pd.DateOffset(years=20)
 
@@ -25,11 +100,13 @@ class GrowthSeries():
             self.start_dt = date_range.min()
             self.end_dt = date_range.max()
             self.freq = date_range.freq
+            self._grid = TimeGrid(date_range.normalize())
         else:
             self.start_dt = start_dt
             self.end_dt = (end_dt if end_dt
                            else start_dt + self.DEFAULT_END_DT_OFFSET)
             self.freq=freq
+            self._grid = TimeGrid.from_bounds(self.start_dt, self.end_dt, freq)
         self.min_val = min_val
         self.max_val = max_val
         self.growth_per_period_fn = growth_per_period_fn
@@ -37,25 +114,16 @@ class GrowthSeries():
 
     @property
     def date_range(self) -> pd.date_range:
-        freq = hp.FREQ_MAP.get(self.freq, self.freq)
-        date_range = pd.date_range(
-            start=self.start_dt,
-            end=self.end_dt,
-            freq=freq,
-            normalize=True
-        )
-        return date_range
+        return self._grid.date_range
 
 
     @property
-    def days_from_start(self) -> List[int]:
+    def days_from_start(self) -> np.ndarray:
         """
-        Get self.date_range expressed as days from start_dt.
+        Get self.date_range expressed as (int64) days from start_dt.
         TO DO: Think about exposing period_resolution == '1D'
         """
-        n_periods = [(x - self.date_range.min())/pd.Timedelta('1D')
-                     for x in self.date_range]
-        return n_periods
+        return self._grid.day_offsets
 
     @property
     def growth_per_period(self) -> NotImplementedError:
@@ -64,14 +132,32 @@ class GrowthSeries():
         return pd.Series(vals)
 
     @property
+    @profiling.stage()
     def growth_series(self) -> pd.Series:
         cum_vals = self.growth_per_period.cumprod().fillna(1).values
         cum_vals_series = pd.Series(cum_vals, index=self.date_range)
 
         return cum_vals_series.clip(lower=self.min_val, upper=self.max_val)
 
+    def growth_paths(self,
+                     n_paths: int,
+                     seed: Optional[hp.SeedLike] = None
+                     ) -> np.ndarray:
+        """
+        Cumulative growth factors as an (n_paths, n_periods) array. Growth is
+        deterministic here, so every path is the same growth_series.
+        """
+        return np.tile(self.growth_series.values, (n_paths, 1))
+
+    def _clip_paths(self, paths: np.ndarray) -> np.ndarray:
+        if self.min_val is None and self.max_val is None:
+            return paths
+        return np.clip(paths, self.min_val, self.max_val)
+
 
 class StochasticGrowth(GrowthSeries):
+    DEFAULT_GROWTH_RANGE = (0.01, 0.05)
+
     def __init__(self,
                  date_range: Optional[pd.date_range] = None,
                  start_dt: Optional[pd.datetime] = None,
@@ -79,8 +165,20 @@ class StochasticGrowth(GrowthSeries):
                  freq: Optional[pd.DateOffset] = pd.DateOffset(years=1),
                  min_val: Optional[float] = None,
                  max_val: Optional[float] = None,
-                 growth_per_period_fn: Callable = lambda x: np.random.uniform(0.01, 0.05),
+                 growth_per_period_fn: Optional[Callable] = None,
+                 growth_rate_sampler: Optional[Callable] = None,
                  **kwargs) -> None:
+        """
+        growth_rate_sampler(rng, size) should draw an array of per-period
+        growth rates from a numpy Generator; it's used by growth_paths. If
+        only a custom growth_per_period_fn is passed, growth_paths falls back
+        to calling it once per period per path.
+        """
+        low, high = self.DEFAULT_GROWTH_RANGE
+        if growth_per_period_fn is None:
+            growth_per_period_fn = lambda x: np.random.uniform(low, high)
+            if growth_rate_sampler is None:
+                growth_rate_sampler = lambda rng, size: rng.uniform(low, high, size)
         super().__init__(
             date_range=date_range,
             start_dt=start_dt,
@@ -90,12 +188,32 @@ class StochasticGrowth(GrowthSeries):
             max_val=max_val,
             growth_per_period_fn=growth_per_period_fn,
         )
+        self.growth_rate_sampler = growth_rate_sampler
 
     @property
     def growth_per_period(self) -> pd.Series:
         vals = [ 1 + self.growth_per_period_fn(x) for x in self.days_from_start]
         return pd.Series(vals)
 
+    def growth_paths(self,
+                     n_paths: int,
+                     seed: Optional[hp.SeedLike] = None
+                     ) -> np.ndarray:
+        """
+        Draw n_paths independent growth paths in one shot, returned as an
+        (n_paths, n_periods) array of cumulative growth factors.
+        """
+        days = self.days_from_start
+        if self.growth_rate_sampler is not None:
+            rng = hp.get_rng(seed)
+            rates = self.growth_rate_sampler(rng, (n_paths, len(days)))
+        else:
+            rates = np.array([[self.growth_per_period_fn(x) for x in days]
+                              for _ in range(n_paths)])
+        paths = np.cumprod(1 + rates, axis=1)
+
+        return self._clip_paths(paths)
+
 
 class FittedPolynomialGrowth(GrowthSeries):
     def __init__(self,
@@ -130,6 +248,11 @@ class FittedPolynomialGrowth(GrowthSeries):
 
     @property
     def _fitted_polynomial(self) -> np.polynomial.polynomial.Polynomial:
+        key = FIT_CACHE.make_key('polynomial', self.degree, self.points_to_fit)
+        return FIT_CACHE.get_or_fit(key, self._fit_polynomial)
+
+    @profiling.stage()
+    def _fit_polynomial(self) -> np.polynomial.polynomial.Polynomial:
         xs = [n[0] for n in self.points_to_fit]
         ys = [n[1] for n in self.points_to_fit]
         # see domain param for below if fitting poorly out of sample.
@@ -137,9 +260,13 @@ class FittedPolynomialGrowth(GrowthSeries):
 
         return poly
 
+    def evaluate(self, xs: np.ndarray) -> np.ndarray:
+        """Fit the polynomial once and evaluate it over the whole grid `xs`."""
+        return self._fitted_polynomial(np.asarray(xs, dtype=float))
+
     @property
     def growth_per_period(self) -> pd.Series:
-        cum_vals = [self._fitted_polynomial(x) for x in self.days_from_start]
+        cum_vals = self.evaluate(self.days_from_start)
         vals = 1 + pd.Series(cum_vals).pct_change()
         return vals
 
@@ -181,6 +308,16 @@ class FittedGrowthSeries(GrowthSeries):
 
     @property
     def _fitted_growth_params(self) -> List[float]:
+        key = FIT_CACHE.make_key(
+            self.growth_fn,
+            self.points_to_fit,
+            self.growth_param_bounds,
+            self.initial_param_guesses
+        )
+        return FIT_CACHE.get_or_fit(key, self._fit_growth_params)
+
+    @profiling.stage()
+    def _fit_growth_params(self) -> np.ndarray:
         xs = [n[0] for n in self.points_to_fit]
         ys = [n[1] for n in self.points_to_fit]
         fitted_params, _ = optimize.curve_fit(
@@ -190,13 +327,21 @@ class FittedGrowthSeries(GrowthSeries):
             bounds=self.growth_param_bounds,
             p0=self.initial_param_guesses
         )
+        fitted_params.setflags(write=False) # shared via FIT_CACHE
 
         return fitted_params
 
+    def evaluate(self, xs: np.ndarray) -> np.ndarray:
+        """
+        Fit growth_fn once and evaluate it over the whole grid `xs`; the
+        growth funcs are plain numpy expressions so they broadcast over arrays.
+        """
+        params = self._fitted_growth_params
+        return self.growth_fn(np.asarray(xs, dtype=float), *params)
+
     @property
     def growth_per_period(self) -> pd.Series:
-        cum_vals = [self.growth_fn(x, *self._fitted_growth_params)
-                    for x in self.days_from_start]
+        cum_vals = self.evaluate(self.days_from_start)
         vals = 1 + pd.Series(cum_vals).pct_change()
         return vals
 
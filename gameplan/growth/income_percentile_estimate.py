@@ -1,6 +1,20 @@
+from functools import lru_cache
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
 import pandas as pd
 import untangle
 
+RAW_DATA_DIR = "gameplan/growth/raw_data/"
+ASEC_CSV = RAW_DATA_DIR + "asec_data.csv"
+DATA_LABELS_XML = RAW_DATA_DIR + "data_labels.xml"
+# Columnar, pre-filtered copy of the working population, see
+# build_working_population_cache
+WORKING_POP_CACHE_DIR = RAW_DATA_DIR + "asec_working_pop/"
+
 def get_data_labels(url):
     obj = untangle.parse(url)
     data = obj.codeBook.dataDscr.var
@@ -15,9 +29,9 @@ def get_data_labels(url):
     return labels
 
 def get_working_population_data():
-    url = "gameplan/growth/raw_data/data_labels.xml"
+    url = DATA_LABELS_XML
     data_labels = get_data_labels(url)
-    ipums = pd.read_csv("gameplan/growth/raw_data/asec_data.csv")
+    ipums = pd.read_csv(ASEC_CSV)
 
     for k, v in data_labels.items():
         ipums[k.lower()] = ipums[k].replace(v)
@@ -28,10 +42,229 @@ def get_working_population_data():
 
     return working_pop
 
+def _source_fingerprint(path=ASEC_CSV):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+def build_working_population_cache(cache_dir=WORKING_POP_CACHE_DIR):
+    """
+    One-time preprocessing of get_working_population_data into a columnar
+    cache that load_working_population_data can memory-map:
+        * numeric/<dtype>.npy - the numeric columns of each dtype, stored as
+          one (n_columns, n_rows) matrix so it maps straight onto a
+          DataFrame block w/o changing the column's dtype
+        * codes/<col>.npy - categorical codes for each labelled column, w/
+          missing values as -1
+        * meta.json - column names, categories & the source csv's fingerprint
+    Labelled values with no label in data_labels.xml are kept as strings.
+    cache_dir ends up a symlink to a versioned directory, swapped atomically.
+    """
+    working_pop = get_working_population_data().reset_index(drop=True)
+    numeric_cols = [
+        c for c in working_pop.columns
+        if pd.api.types.is_numeric_dtype(working_pop[c])
+    ]
+    categorical_cols = [c for c in working_pop.columns if c not in numeric_cols]
+
+    cache_path = cache_dir.rstrip('/')
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(cache_path) + '.',
+                               dir=os.path.dirname(cache_path))
+    os.mkdir(os.path.join(tmp_dir, 'numeric'))
+    os.mkdir(os.path.join(tmp_dir, 'codes'))
+    numeric_blocks = {}
+    for col in numeric_cols:
+        numeric_blocks.setdefault(str(working_pop[col].dtype), []).append(col)
+    for dtype, cols in numeric_blocks.items():
+        block = np.ascontiguousarray(working_pop[cols].values.T, dtype=dtype)
+        np.save(os.path.join(tmp_dir, 'numeric', f'{dtype}.npy'), block)
+    categories = {}
+    for col in categorical_cols:
+        values = working_pop[col]
+        # NaNs stay missing (code -1) rather than becoming a 'nan' category
+        cat = pd.Categorical(values.where(values.isna(), values.astype(str)))
+        np.save(os.path.join(tmp_dir, 'codes', f'{col}.npy'), cat.codes)
+        categories[col] = cat.categories.tolist()
+
+    meta = dict(
+        numeric_blocks=numeric_blocks,
+        categories=categories,
+        source=_source_fingerprint(),
+    )
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # Swap the finished cache in by atomically replacing the symlink, so
+    # readers see either the old or the new version, never a missing or
+    # half-deleted one; several workers may race to build it & the last wins
+    previous = (os.path.realpath(cache_path) if os.path.islink(cache_path)
+                else None)
+    if os.path.isdir(cache_path) and not os.path.islink(cache_path):
+        # a plain directory (older cache layout) can't be replaced by a link
+        aside = tempfile.mkdtemp(dir=os.path.dirname(cache_path))
+        os.rename(cache_path, os.path.join(aside, 'old'))
+        shutil.rmtree(aside, ignore_errors=True)
+    tmp_link = tmp_dir + '.link'
+    os.symlink(os.path.basename(tmp_dir), tmp_link)
+    os.replace(tmp_link, cache_path)
+    if previous is not None and previous != os.path.realpath(tmp_dir):
+        # Loaders resolve the link once, so only ones mid-load still use
+        # this & their mapped pages outlive the unlink
+        shutil.rmtree(previous, ignore_errors=True)
+
+def _cache_is_fresh(cache_dir):
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if 'numeric_blocks' not in meta: # older cache layout
+        return False
+    cached_source = meta['source']
+    source = _source_fingerprint()
+    # No raw csv (e.g. a deploy that only ships the cache) -> use the cache
+    return source is None or source == cached_source
+
+def load_working_population_data(cache_dir=WORKING_POP_CACHE_DIR):
+    """
+    Memory-map the columnar working population cache (building it first if
+    it's missing or older than asec_data.csv). The numeric columns stay on
+    read-only mapped pages shared by every process that loads them (pandas
+    copies the small categorical codes); filtering returns copies.
+    """
+    if not _cache_is_fresh(cache_dir):
+        build_working_population_cache(cache_dir)
+
+    # Pin one version of the cache, in case it's rebuilt while we load
+    cache_dir = os.path.realpath(cache_dir)
+    with open(os.path.join(cache_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    # block.T is (n_rows, n_columns); pandas keeps each as a single block
+    df = pd.concat([
+        pd.DataFrame(
+            np.load(os.path.join(cache_dir, 'numeric', f'{dtype}.npy'),
+                    mmap_mode='r').T,
+            columns=cols, copy=False
+        )
+        for dtype, cols in meta['numeric_blocks'].items()
+    ], axis=1, copy=False)
+    for col, categories in meta['categories'].items():
+        codes = np.load(os.path.join(cache_dir, 'codes', f'{col}.npy'),
+                        mmap_mode='r')
+        df[col] = pd.Categorical.from_codes(codes, categories=categories)
+
+    return df
+
+def weighted_percentile(incomes, weights, income):
+    "Weighted % (0-100) of incomes that are <= income."
+    incomes = np.asarray(incomes, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    if total == 0:
+        return np.nan
+    return 100 * weights[incomes <= income].sum() / total
+
+class CohortIncomeIndex():
+    """
+    Weighted income distributions of the working population, bucketed by
+    (metro area, age, sex). All incomes live in one array sorted by bucket
+    then income, alongside a running sum of ASECWT weights, so a cohort
+    (metro area, age window, gender) is just a handful of bucket slices:
+        * percentile() is one searchsorted per bucket, no filter or sort
+        * cdf() merges the (already sorted) buckets for plotting
+    """
+    GENDERS = ['Male', 'Female']
+
+    def __init__(self, working_pop: pd.DataFrame) -> None:
+        metareas = pd.Categorical(working_pop['metarea'].astype(str))
+        sexes = pd.Categorical(working_pop['sex'].astype(str))
+        ages = working_pop['AGE'].values.astype(int)
+        incomes = working_pop['inctot'].values.astype(float)
+        weights = working_pop['ASECWT'].values.astype(float)
+
+        order = np.lexsort((incomes, sexes.codes, ages, metareas.codes))
+        self.incomes = incomes[order]
+        self.weights = weights[order]
+        self.cum_weights = np.concatenate([[0.0], np.cumsum(self.weights)])
+
+        keys = np.column_stack(
+            [metareas.codes[order], ages[order], sexes.codes[order]]
+        )
+        is_new_bucket = np.any(keys[1:] != keys[:-1], axis=1)
+        starts = np.concatenate([[0], np.flatnonzero(is_new_bucket) + 1])
+        ends = np.append(starts[1:], len(order))
+        self.buckets = {
+            (metareas.categories[m], int(a), sexes.categories[g]): (int(s), int(e))
+            for (m, a, g), s, e in zip(keys[starts], starts, ends)
+        }
+        self.metareas = list(metareas.categories)
+        self._msa_matches = {}
+
+    def _matching_metareas(self, msa: str) -> list:
+        # Same semantics as metarea.str.contains(msa), resolved once per msa
+        if msa not in self._msa_matches:
+            self._msa_matches[msa] = [m for m in self.metareas if msa in m]
+        return self._msa_matches[msa]
+
+    def _cohort_buckets(self, msa, age_range, gender) -> list:
+        genders = [gender] if gender in self.GENDERS else self.GENDERS
+        ages = range(int(age_range[0]), int(age_range[1]) + 1)
+        return [
+            self.buckets[key]
+            for key in (
+                (m, a, g) for m in self._matching_metareas(msa)
+                for a in ages for g in genders
+            )
+            if key in self.buckets
+        ]
+
+    def cohort_size(self, msa, age_range, gender) -> int:
+        return sum(e - s for s, e in self._cohort_buckets(msa, age_range, gender))
+
+    def percentile(self, income, msa, age_range, gender) -> float:
+        "Weighted % (0-100) of the cohort earning <= income."
+        below = total = 0.0
+        for s, e in self._cohort_buckets(msa, age_range, gender):
+            i = s + np.searchsorted(self.incomes[s:e], income, side='right')
+            below += self.cum_weights[i] - self.cum_weights[s]
+            total += self.cum_weights[e] - self.cum_weights[s]
+        return 100 * below / total if total else np.nan
+
+    def cdf(self, msa, age_range, gender) -> pd.DataFrame:
+        "Cohort incomes, normalized weights & weighted cdf, sorted by income."
+        buckets = self._cohort_buckets(msa, age_range, gender)
+        idx = (np.concatenate([np.arange(s, e) for s, e in buckets])
+               if buckets else np.array([], dtype=int))
+        incomes = self.incomes[idx]
+        # buckets are each sorted, so a stable merge sort is cheap here
+        order = np.argsort(incomes, kind='mergesort')
+        weights = self.weights[idx][order]
+        weights = weights / weights.sum() if len(weights) else weights
+        return pd.DataFrame({
+            'inctot': incomes[order],
+            'weight': weights,
+            'cdf': np.cumsum(weights),
+        })
+
+@lru_cache(maxsize=1)
+def get_cohort_income_index():
+    "CohortIncomeIndex over the shared working population, built on first use."
+    return CohortIncomeIndex(get_shared_working_population_data())
+
+@lru_cache(maxsize=1)
+def get_shared_working_population_data():
+    "The memory-mapped working population, loaded on first use."
+    return load_working_population_data()
+
 def get_cohort_data(age, metro_area='', age_window=2):
-    working_pop = get_working_population_data()
+    working_pop = get_shared_working_population_data()
     cohort = working_pop[
         working_pop['AGE'].between(age - age_window, age + age_window)
         & working_pop['metarea'].str.contains(metro_area)
     ]
     return cohort
+
+if __name__ == '__main__':
+    # e.g. as a deploy step: python -m gameplan.growth.income_percentile_estimate
+    build_working_population_cache()
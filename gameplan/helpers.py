@@ -1,5 +1,10 @@
+from functools import lru_cache, wraps
+import numpy as np
 import pandas as pd
 import re
+from typing import Optional, Union
+
+from gameplan import profiling
 
 
 FREQ_MAP = {
@@ -7,6 +12,9 @@ FREQ_MAP = {
 }
 
 
+SeedLike = Union[int, np.random.Generator]
+
+
 def get_offset_date(freq, ref_date=pd.datetime.today(), rollback=False):
     offset = pd.tseries.frequencies.to_offset(freq)
     if rollback:
@@ -15,6 +23,64 @@ def get_offset_date(freq, ref_date=pd.datetime.today(), rollback=False):
         return offset.rollforward(ref_date)
 
 
+@lru_cache(maxsize=32)
+def _get_date_range(start, end, freq):
+    return pd.date_range(start=start, end=end, freq=freq)
+
+
+def get_default_date_range(freq='D', years=20, end=None, start=None):
+    """
+    Date range from today (or `start`) through `years` years out (or `end`),
+    built on first use and shared after that; DatetimeIndexes are immutable
+    so sharing is safe, and keying on today keeps long-running workers from
+    going stale.
+    """
+    start = (pd.Timestamp(start) if start is not None
+             else pd.Timestamp.today()).normalize()
+    end = pd.Timestamp(end) if end is not None else start + pd.DateOffset(years=years)
+    return _get_date_range(start, end, freq)
+
+
+def get_rng(seed: Optional[SeedLike] = None) -> np.random.Generator:
+    "Pass Generators through untouched so a batch of draws shares one stream."
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+_CACHE_ATTRS = set() # instance attrs cached_until_changed stores results in
+
+
+def cached_until_changed(key_fn):
+    """
+    Cache a method's result on the instance, recomputing only when
+    key_fn(self) changes (e.g. a Collection's version counter).
+    """
+    def decorator(fn):
+        attr = f'_{fn.__name__}_cache'
+        _CACHE_ATTRS.add(attr)
+
+        @wraps(fn)
+        def wrapper(self):
+            key = key_fn(self)
+            cached = self.__dict__.get(attr)
+            if cached is None or cached[0] != key:
+                cached = (key, fn(self))
+                self.__dict__[attr] = cached
+            return cached[1]
+        return wrapper
+    return decorator
+
+
+def clear_cached(obj) -> None:
+    """
+    Drop every cached_until_changed result stored on obj, e.g. on a shallow
+    copy whose version counters may no longer match what they were keyed on.
+    """
+    for attr in _CACHE_ATTRS.intersection(vars(obj)):
+        del obj.__dict__[attr]
+
+
 def combine_list_of_dicts(L):
     "TO DO: Make this clearer"
     return {k: v for d in L if d is not None for k, v in d.items()}
@@ -32,3 +98,44 @@ def compound_interest(principal, rate, times_per_year, years):
     exponent = times_per_year * years
     # P(1 + r/n)^nt
     return principal * pow(body, exponent)
+
+
+@profiling.stage()
+def accumulate_compounded(flows, factors, block_size=None):
+    """
+    Vectorized scan for the linear recurrence
+        total[t] = flows[t] + factors[t] * total[t - 1],  total[-1] = 0
+    along the last axis, so flows/factors can be (n_periods,) or
+    (n_paths, n_periods). NaN factors are treated as 0 (i.e. no carry).
+
+    Within a block, total[t] = Q[t] * cumsum(flows / Q)[t] + carry * R[t]
+    where Q/R are running products of the factors. Long horizons can over- or
+    underflow those products, so passing block_size re-bases them every
+    block_size periods (a few Python iterations, each a numpy op).
+    """
+    flows = np.asarray(flows, dtype=float)
+    factors = np.nan_to_num(np.asarray(factors, dtype=float), nan=0.0)
+    flows, factors = np.broadcast_arrays(flows, factors)
+    n = flows.shape[-1]
+    if n == 0:
+        return flows.copy()
+
+    block_size = block_size or n
+    # Zero factors reset the running products, so they must start a block
+    zeros = np.flatnonzero((factors == 0).reshape(-1, n).any(axis=0))
+    starts = np.union1d(np.arange(0, n, block_size), zeros)
+    ends = np.append(starts[1:], n)
+
+    totals = np.empty_like(flows)
+    carry = np.zeros(flows.shape[:-1])
+    for s, e in zip(starts, ends):
+        r = factors[..., s:e].copy()
+        first_r = r[..., 0].copy()
+        r[..., 0] = 1.0
+        running = np.cumprod(r, axis=-1)
+        block = running * np.cumsum(flows[..., s:e] / running, axis=-1)
+        block += (carry * first_r)[..., None] * running
+        totals[..., s:e] = block
+        carry = block[..., -1]
+
+    return totals
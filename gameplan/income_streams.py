@@ -8,13 +8,15 @@ from gameplan.gp_collections import CashFlowCollection
 from gameplan.contributions import Deduction
 from gameplan.growth.growth_series import GrowthSeries, FittedPolynomialGrowth
 import gameplan.helpers as hp
+from gameplan import profiling
+from gameplan.time_grid import to_epoch_days
 
 
 class IncomeStream(CashFlow):
     def __init__(self, income_type, amount=None, freq=None, start_dt=None,
                  end_dt=None, date_range=None, values=None, tax_rate=0.0,
                  growth_series=None, growth_per_period_fn=None,
-                 growth_freq=pd.DateOffset(years=1), min_growth=None,
+                 growth_rate_sampler=None, growth_freq=pd.DateOffset(years=1), min_growth=None,
                  max_growth=None, growth_start_dt=None, growth_end_dt=None,
                  incorporate_growth=True, incorporate_discounting=True,
                  yearly_discount_rate=0.02, **kwargs):
@@ -36,6 +38,7 @@ class IncomeStream(CashFlow):
             min_growth=min_growth,
             max_growth=max_growth,
             growth_per_period_fn=growth_per_period_fn,
+            growth_rate_sampler=growth_rate_sampler,
             incorporate_growth=incorporate_growth,
             incorporate_discounting=incorporate_discounting,
             yearly_discount_rate=yearly_discount_rate,
@@ -58,6 +61,8 @@ class Salary(IncomeStream):
                  max_growth: Optional[float] = None,
                  growth_start_dt: Optional[Union[str, datetime]] = None,
                  growth_end_dt: Optional[Union[str, datetime]] = None,
+                 growth_per_period_fn: Optional[Callable] = None,
+                 growth_rate_sampler: Optional[Callable] = None,
                  incorporate_growth: bool = True,
                  incorporate_discounting: bool = False,
                  yearly_discount_rate: float = 0.0,
@@ -85,6 +90,8 @@ class Salary(IncomeStream):
             max_growth=max_growth,
             growth_start_dt=growth_start_dt,
             growth_end_dt=growth_end_dt,
+            growth_per_period_fn=growth_per_period_fn,
+            growth_rate_sampler=growth_rate_sampler,
             addtl_growth_params=dict(points_to_fit=growth_points_to_fit),
             incorporate_growth=incorporate_growth,
             incorporate_discounting=incorporate_discounting,
@@ -156,6 +163,8 @@ class Salary(IncomeStream):
         return pd.Series(total_taxes, name='total_taxes')
 
     @property
+    @hp.cached_until_changed(lambda self: self._cache_key())
+    @profiling.stage()
     def take_home_salary(self):
         post_taxes = self.post_deductions + self.total_taxes
         return pd.Series(post_taxes, name='take_home_salary')
@@ -169,6 +178,25 @@ class Salary(IncomeStream):
             ], axis=1)
         return df
 
+    def _as_columns(self):
+        df = self.cash_flows_df
+        return to_epoch_days(df.index), list(df.columns), df.values
+
+    def _cache_key(self):
+        return (self.deductions._cache_key(), self.tax_rate)
+
+    def _present_value_basis(self):
+        """
+        Take-home (not gross) salary, as collections total it, w/o any
+        discounting: take_home_salary is built from _values, so scale it
+        back by _nominal_values / _values.
+        """
+        take_home = self.take_home_salary.reindex(self.date_range).values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            undiscount = np.where(self._values != 0,
+                                  self._nominal_values / self._values, 1.0)
+        return take_home * undiscount
+
     @property
     def annualized_salary(self):
         """TO DO: refactor"""
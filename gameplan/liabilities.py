@@ -1,7 +1,102 @@
 import pandas as pd
 import numpy as np
+from typing import Dict, List, NamedTuple, Optional
 
+import gameplan.helpers as hp
 from gameplan.cashflows import CashFlow
+from gameplan.discounting import DAYS_PER_YEAR
+from gameplan.time_grid import TimeGrid
+
+
+class AmortizationSchedule(NamedTuple):
+    "(n_loans, n_periods) arrays; balance is what's owed after each payment."
+    payment: np.ndarray
+    interest: np.ndarray
+    principal: np.ndarray
+    balance: np.ndarray
+
+
+def annuity_payment(principal, periodic_rate, n_periods):
+    "Level payment that pays off principal in n_periods at periodic_rate."
+    principal, rate, n_periods = np.broadcast_arrays(
+        np.asarray(principal, dtype=float),
+        np.asarray(periodic_rate, dtype=float),
+        np.asarray(n_periods, dtype=float),
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pmt = principal * rate / (1 - (1 + rate)**-n_periods)
+    return np.where(rate == 0, principal / n_periods, pmt)
+
+
+def amortize(principal,
+             periodic_rates,
+             payment=None,
+             n_periods: Optional[int] = None,
+             term_periods=None,
+             block_size: int = 120
+             ) -> AmortizationSchedule:
+    """
+    Payment/interest/principal/balance schedules for a batch of loans.
+        * principal - (n_loans,) outstanding balances (or a scalar)
+        * periodic_rates - rate per payment period, either one per loan (with
+          n_periods), or an (n_loans, n_periods) array for varying rates
+        * payment - level payment per loan; defaults to the annuity payment
+          over term_periods (default n_periods) at each loan's first rate
+    Constant rates use the closed-form annuity balance; varying rates use
+    the vectorized recurrence in hp.accumulate_compounded, re-based every
+    block_size periods. Loans stop paying once paid off (the last payment
+    is trimmed to the balance), & negative amortization is left to grow.
+    """
+    principal = np.atleast_1d(np.asarray(principal, dtype=float))
+    rates = np.asarray(periodic_rates, dtype=float)
+    if rates.ndim == 2:
+        n_periods = rates.shape[1]
+        rates = np.broadcast_to(rates, (len(principal), n_periods))
+        if (rates == rates[:, :1]).all():
+            rates = rates[:, 0]
+    elif n_periods is None:
+        raise ValueError("n_periods is required for constant rates.")
+    else:
+        rates = np.broadcast_to(rates, principal.shape)
+    first_rates = rates[:, 0] if rates.ndim == 2 else rates
+    term_periods = n_periods if term_periods is None else term_periods
+    payment = (
+        annuity_payment(principal, first_rates, term_periods) if payment is None
+        else np.broadcast_to(np.asarray(payment, dtype=float), principal.shape)
+    )
+
+    if rates.ndim == 1:
+        growth = (1 + rates[:, None])**np.arange(1, n_periods + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            annuity = np.where(
+                rates[:, None] == 0,
+                np.arange(1, n_periods + 1),
+                (growth - 1) / rates[:, None]
+            )
+        raw_balance = principal[:, None] * growth - payment[:, None] * annuity
+        rates = np.broadcast_to(rates[:, None], raw_balance.shape)
+    else:
+        flows = np.broadcast_to(-payment[:, None], rates.shape).copy()
+        flows[:, 0] += principal * (1 + rates[:, 0])
+        raw_balance = hp.accumulate_compounded(flows, 1 + rates,
+                                               block_size=block_size)
+
+    # Clean up float noise around a loan's final payment
+    tolerance = 1e-9 * np.maximum(principal, 1.0)[:, None]
+    raw_balance = np.where(np.abs(raw_balance) < tolerance, 0.0, raw_balance)
+    prior_balance = np.concatenate([principal[:, None], raw_balance[:, :-1]], axis=1)
+    active = prior_balance > 0
+    interest = np.where(active, rates * prior_balance, 0.0)
+    pmt = np.where(active, np.minimum(payment[:, None], prior_balance + interest), 0.0)
+    balance = np.where(active, prior_balance + interest - pmt, 0.0)
+
+    return AmortizationSchedule(
+        payment=pmt,
+        interest=interest,
+        principal=pmt - interest,
+        balance=balance,
+    )
+
 
 class InterestRateSeries():
     @staticmethod
@@ -14,6 +109,11 @@ class InterestRateSeries():
 
     def __init__(self, spread, name='Interest Rate', rate_type='fixed', index=None,
                  start_dt=None, end_dt=None, freq='D'):
+        """
+        spread is an annualized rate; for rate_type='index', index may be a
+        pd.Series of annualized index rates (forward filled onto
+        date_range) or an index name/ticker (see get_index_rates).
+        """
         self.name = name
         self.start_dt = start_dt if start_dt else hp.get_offset_date(freq)
         self.end_dt = end_dt if end_dt else hp.get_offset_date(
@@ -23,29 +123,45 @@ class InterestRateSeries():
         self.rate_type = rate_type
         self.index = index
         self.freq = freq
+        self._grid = TimeGrid.from_bounds(self.start_dt, self.end_dt, freq)
 
     @property
     def date_range(self):
-        freq = hp.FREQ_MAP.get(self.freq, self.freq)
-        date_range = pd.date_range(
-            start=self.start_dt,
-            end=self.end_dt,
-            freq=freq,
-            normalize=True
-        )
+        return self._grid.date_range
 
-        return date_range
+    @property
+    def periods_per_year(self) -> float:
+        "Payment periods per year, inferred from the typical gap in date_range."
+        if len(self._grid) < 2:
+            return 1.0
+        return float(np.round(DAYS_PER_YEAR / np.median(np.diff(self._grid.day_offsets))))
 
     @property
     def index_rates(self):
-        return self.get_index_rates(self.index) if self.index else None
+        if self.index is None:
+            return None
+        if isinstance(self.index, pd.Series):
+            return self.index.reindex(self.date_range, method='ffill').fillna(0)
+        return self.get_index_rates(self.index)
+
+    @property
+    def is_constant(self) -> bool:
+        return self.index is None
 
     @property
     def interest_rates(self):
-        index_rates = self.index_rates if self.index_rates else pd.Series([0] * len(self.date_range))
+        "Annualized rate at each date in date_range."
+        index_rates = self.index_rates
+        index_rates = (np.zeros(len(self._grid)) if index_rates is None
+                       else np.asarray(index_rates, dtype=float))
         interest_rates = index_rates + self.spread
 
-        return interest_rates.values
+        return interest_rates
+
+    @property
+    def periodic_rates(self):
+        "Rate per period of date_range, e.g. annual rate / 12 for monthly."
+        return self.interest_rates / self.periods_per_year
 
     @property
     def interest_rates_df(self):
@@ -63,24 +179,39 @@ class Liability():
     def __init__(self, liability_type):
         self.liability_type = liability_type
 
-    def get_debt_service_cost(self):
-        pass
+    def get_pmt_schedule(self, pmt_amount=None) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def get_debt_service_cost(self, pmt_amount=None) -> CashFlow:
+        "Scheduled payments (principal + interest) as an outflow CashFlow."
+        schedule = self.get_pmt_schedule(pmt_amount)
+        return CashFlow(
+            cashflow_type='debt_service',
+            name=f'{getattr(self, "name", self.liability_type)}_debt_service',
+            date_range=schedule.index,
+            values=schedule['payment'].values,
+            outflow=True,
+        )
 
 
-class StudentDebt():
+class StudentDebt(Liability):
     def __init__(self, principal_outstanding, interest_rate_spread, interest_rate_type='fixed',
 
-                 interest_rate_index=None, prepayment_penalty=None, payment_freq='MS', start_dt=None):
-
-        self.liability_type = 'student_debt'
-        self.name = 'NYU'
+                 interest_rate_index=None, prepayment_penalty=None, payment_freq='MS', start_dt=None,
+                 minimum_pmt=None, repayment_period=10, name='student_debt'):
+        """
+        interest_rate_spread is annualized; repayment_period (in years) sets
+        the default, level payment, which minimum_pmt (per period) overrides.
+        """
+        super().__init__(liability_type='student_debt')
+        self.name = name
         self.principal_outstanding = principal_outstanding
         self.start_dt = start_dt if start_dt else hp.get_offset_date(payment_freq)
         self.interest_rate = InterestRateSeries( # Should this be annualized or something?
             rate_type=interest_rate_type,
             spread=interest_rate_spread,
             index=interest_rate_index,
-            start_dt=None,
+            start_dt=self.start_dt,
             end_dt=None,
             freq=payment_freq
         )
@@ -89,10 +220,99 @@ class StudentDebt():
         self.minimum_pmt = minimum_pmt
         self.repayment_period = repayment_period
 
-    def get_pmt_schedule(self, pmt_amount):
-        start_dt = self.start_dt
-        # Translate annualized interest rate into interest rate btwn payments
-        # Deduct pmt amount from principal each month
-        # Add interest payment
+    @property
+    def term_periods(self) -> int:
+        return int(round(self.repayment_period * self.interest_rate.periods_per_year))
 
-        pass
+    def _amortize(self, pmt_amounts=None) -> AmortizationSchedule:
+        "One schedule row per pmt_amount (default: minimum_pmt or the annuity)."
+        pmt_amounts = (
+            np.atleast_1d(pmt_amounts) if pmt_amounts is not None
+            else np.atleast_1d(self.minimum_pmt) if self.minimum_pmt is not None
+            else None
+        )
+        n_loans = 1 if pmt_amounts is None else len(pmt_amounts)
+        rates = self.interest_rate.periodic_rates
+        return amortize(
+            principal=np.full(n_loans, self.principal_outstanding, dtype=float),
+            periodic_rates=(
+                np.full(n_loans, rates[0]) if self.interest_rate.is_constant
+                else np.tile(rates, (n_loans, 1))
+            ),
+            payment=pmt_amounts,
+            n_periods=len(rates),
+            term_periods=self.term_periods,
+        )
+
+    def get_pmt_schedule(self, pmt_amount=None) -> pd.DataFrame:
+        """
+        Payment, interest & principal paid each period, and the balance after,
+        until the debt is paid off.
+        """
+        schedule = self._amortize(pmt_amount)
+        df = pd.DataFrame(
+            {k: v[0] for k, v in schedule._asdict().items()},
+            index=self.interest_rate.date_range,
+        )
+        return df[df['payment'] > 0]
+
+    def compare_pmt_amounts(self, pmt_amounts) -> pd.DataFrame:
+        "Payoff date, # of payments & total interest for each of pmt_amounts."
+        schedule = self._amortize(pmt_amounts)
+        return _summarize_payoff(
+            schedule,
+            [self.interest_rate.date_range] * len(pmt_amounts),
+            index=pd.Index(pmt_amounts, name='pmt_amount')
+        )
+
+
+def _summarize_payoff(schedule: AmortizationSchedule,
+                      date_ranges: List[pd.DatetimeIndex],
+                      index: pd.Index) -> pd.DataFrame:
+    "One row per loan in schedule; date_ranges are each loan's payment dates."
+    n_payments = (schedule.payment > 0).sum(axis=1)
+    paid_off = schedule.balance[:, -1] <= 0
+    payoff_dt = [
+        date_range[n - 1] if done and 0 < n <= len(date_range) else pd.NaT
+        for date_range, n, done in zip(date_ranges, n_payments, paid_off)
+    ]
+    return pd.DataFrame({
+        'n_payments': n_payments,
+        'payoff_dt': payoff_dt,
+        'total_interest': schedule.interest.sum(axis=1),
+        'total_paid': schedule.payment.sum(axis=1),
+        'remaining_balance': schedule.balance[:, -1],
+    }, index=index)
+
+
+def compare_debt_payoffs(debts: Dict[str, StudentDebt]) -> pd.DataFrame:
+    """
+    Payoff summary for many debts, amortized in one batch per payment
+    frequency (debts on the same schedule share one amortize call).
+    """
+    summaries = []
+    by_freq = {}
+    for label, debt in debts.items():
+        by_freq.setdefault(debt.payment_freq, []).append((label, debt))
+    for group in by_freq.values():
+        labels = [label for label, _ in group]
+        rate_series = [d.interest_rate for _, d in group]
+        periodic_rates = [x.periodic_rates for x in rate_series]
+        n_periods = max(len(x) for x in periodic_rates)
+        rates = np.stack([
+            np.pad(x, (0, n_periods - len(x)), mode='edge') for x in periodic_rates
+        ])
+        payments = np.array([
+            d.minimum_pmt if d.minimum_pmt is not None
+            else annuity_payment(d.principal_outstanding, x[0], d.term_periods)
+            for (_, d), x in zip(group, periodic_rates)
+        ], dtype=float)
+        schedule = amortize(
+            principal=[d.principal_outstanding for _, d in group],
+            periodic_rates=rates,
+            payment=payments,
+        )
+        summaries.append(_summarize_payoff(
+            schedule, [x.date_range for x in rate_series], pd.Index(labels)
+        ))
+    return pd.concat(summaries) if summaries else pd.DataFrame()
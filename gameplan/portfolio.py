@@ -1,13 +1,15 @@
 import pandas as pd
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 from gameplan.assets import Assets, CashSavings
 from gameplan.cashflows import CashFlow
+from gameplan.child_expenditures import get_household_expenditures
 from gameplan.gp_collections import Collection, CashFlowCollection
-from gameplan.contributions import Contribution
+from gameplan.contributions import Contribution, Deduction
 from gameplan.expenses import Expense, Expenses
 from gameplan.income_streams import IncomeStreams
-from gameplan.liabilities import Liability
+from gameplan.liabilities import Liability, compare_debt_payoffs
+from gameplan import profiling
 
 
 class Portfolio():
@@ -19,21 +21,37 @@ class Portfolio():
             initial_balance=initial_cash_savings,
             annualized_interest_rate=annualized_interest_rate
             )
-        self.assets = Assets(objects={'cash_savings': init_cs})
-        self.liablities = Collection(collection_type=Liability, objects={})
+        self._assets = Assets(objects={'cash_savings': init_cs})
+        self.liabilities = Collection(collection_type=Liability, objects={})
         self.income_streams = IncomeStreams(income_streams={})
         self.expenses = Expenses(expenses={}) #+ ...
+        # Cash savings flows are derived lazily, see _sync_cash_savings
+        self._cash_savings_synced_key = None
+
+    @property
+    def assets(self) -> Assets:
+        "The portfolio's assets, w/ cash savings flows synced to salary/expenses."
+        if 'salary' in self.income_streams.contents:
+            self._sync_cash_savings()
+        return self._assets
+
+    @staticmethod
+    def sweep(build_fn, param_grid, **kwargs) -> pd.DataFrame:
+        """
+        Metrics of the Portfolio build_fn(**params) returns for each point of
+        param_grid, across worker processes - see gameplan.scenarios.sweep.
+        """
+        from gameplan.scenarios import sweep
+        return sweep(build_fn, param_grid, **kwargs)
 
     def add_income_stream(self, income_stream, label=None, if_exists='error') -> None:
         self.income_streams.add_object(income_stream, label, if_exists)
 
     def add_expense(self, expense, label=None, if_exists='error')-> None:
         self.expenses.add_object(expense, label, if_exists)
-        self.update_cash_savings() # TO DO: figure out if this crude solution actually works
 
     def remove_expense(self, label) -> None:
         self.expenses.remove_object(label)
-        self.update_cash_savings() # TO DO: figure out if this crude solution actually works
 
     def add_pretax_expense(self,
                            from_income_stream_label: str,
@@ -52,49 +70,124 @@ class Portfolio():
                       )
         inc.add_deduction(label=exp.name, amt=exp.amount, if_exists=if_exists)
         # self.expenses.add_object(exp, label, if_exists)
-        self.update_cash_savings() # TO DO: figure out if this crude solution actually works
 
     def remove_pretax_expense(self) -> None:
         # TO DO: do i need this?
         raise NotImplementedError
 
+    def add_children(self,
+                     bdays: List[pd.datetime],
+                     region: str,
+                     income_group: str,
+                     label: str = 'children',
+                     if_exists: str = 'error'
+                     ) -> None:
+        """
+        Add child expenditures for children born (or expected) on bdays as
+        one monthly Expense, scaled for the # of children in the household.
+        """
+        if not len(bdays):
+            raise ValueError("bdays must include at least one birthday.")
+        expenditures = get_household_expenditures(bdays, region, income_group)
+        exp = Expense(expense_type=label,
+                      date_range=expenditures.index,
+                      values=expenditures['total_exp'].values,
+                      recurring=True,
+                      incorporate_growth=False,
+                      )
+        self.add_expense(exp, label, if_exists)
+
     def add_asset(self, asset, label=None, if_exists='error') -> None:
-        self.assets.add_object(asset, label, if_exists)
+        self._assets.add_object(asset, label, if_exists)
 
     def add_liability(self, liability, label=None, if_exists='error') -> None:
         self.liabilities.add_object(liability, label, if_exists)
 
-    def add_401k_contribution(self,
-                              income_stream_label: str,
-                              contrib_pct: float,
-                              employer_match: Optional[Dict[str, float]] = None,
-                              label: str = '401k',
-                              if_exists: str = 'error'
-                              ) -> None:
-        """employer_match should be a dict w/ keys == {'upto', 'pct_match'}"""
-        #TO DO: does this need a remove method as well?
-        inc = self.income_streams.contents[income_stream_label]
-        inc.add_deduction(label=label, pct=contrib_pct, if_exists=if_exists,
-                          max_amt=19500, max_amt_freq='Y')
+    def compare_debt_payoffs(self) -> pd.DataFrame:
+        "Payoff summary of each liability, see liabilities.compare_debt_payoffs."
+        return compare_debt_payoffs(self.liabilities.contents)
+
+    @staticmethod
+    def get_401k_cash_flows(income_stream,
+                            contrib_pct: float,
+                            employer_match: Optional[Dict[str, float]] = None,
+                            label: str = '401k'
+                            ) -> Tuple[Deduction, Contribution, Optional[Contribution]]:
+        """
+        (deduction from income_stream, employee contribution, employer
+        contribution or None) for add_401k_contribution. They only read
+        income_stream, so can be built once & reused across portfolios.
+        """
+        deduction = Deduction.from_income_stream(
+            income_stream=income_stream,
+            pct=contrib_pct,
+            label=label,
+            max_amt=19500,
+            max_amt_freq='Y'
+        )
         employee_contrib = Contribution.from_income_stream(
-            income_stream=inc,
+            income_stream=income_stream,
             pct=contrib_pct,
             label=f'401k_employee_contribs_{contrib_pct:.1%}',
             max_amt=19500,
             max_amt_freq='Y'
         )
-        # To Do: What happens if no 401k exists yet
-        self.assets.contents['401k'].add_contribution(employee_contrib, if_exists=if_exists)
-
+        employer_contrib = None
         if employer_match:
             upto = employer_match['upto']
             pct_match = employer_match['pct_match']
             match_pct = min(contrib_pct, upto) * pct_match
-            employer_contrib = Contribution.from_income_stream(inc, pct=match_pct,
+            employer_contrib = Contribution.from_income_stream(income_stream, pct=match_pct,
                                                                label=f'401k_employer_contribs_{match_pct:.1%}')
-            self.assets.contents['401k'].add_contribution(employer_contrib, if_exists=if_exists)
+        return deduction, employee_contrib, employer_contrib
+
+    def add_401k_contribution(self,
+                              income_stream_label: str,
+                              contrib_pct: float,
+                              employer_match: Optional[Dict[str, float]] = None,
+                              label: str = '401k',
+                              if_exists: str = 'error',
+                              cash_flows: Optional[tuple] = None
+                              ) -> None:
+        """
+        employer_match should be a dict w/ keys == {'upto', 'pct_match'}.
+        cash_flows may be a precomputed get_401k_cash_flows(...) for the same
+        income stream & args, e.g. one cached across portfolios.
+        """
+        if not contrib_pct:
+            raise ValueError("contrib_pct must be > 0, see remove_401k_contribution")
+        inc = self.income_streams.contents[income_stream_label]
+        deduction, employee_contrib, employer_contrib = (
+            cash_flows if cash_flows is not None
+            else self.get_401k_cash_flows(inc, contrib_pct, employer_match, label)
+        )
+        inc.add_deduction(deduction, label=label, if_exists=if_exists)
+        # To Do: What happens if no 401k exists yet
+        # Keyed by label (not pct) so re-adding at another pct replaces these
+        self._assets.contents['401k'].add_contribution(employee_contrib,
+                                                      label=f'{label}_employee_contribs',
+                                                      if_exists=if_exists)
 
-        self.update_cash_savings() # TO DO: figure out if this crude solution actually works
+        if employer_contrib is not None:
+            self._assets.contents['401k'].add_contribution(employer_contrib,
+                                                          label=f'{label}_employer_contribs',
+                                                          if_exists=if_exists)
+        else:
+            self._assets.contents['401k'].credits_and_debits.remove_object(
+                f'{label}_employer_contribs', verbose=False
+            )
+
+    def remove_401k_contribution(self,
+                                 income_stream_label: str,
+                                 label: str = '401k'
+                                 ) -> None:
+        "Undo add_401k_contribution, i.e. the deduction & both contributions."
+        inc = self.income_streams.contents[income_stream_label]
+        inc.deductions.remove_object(label)
+        for contrib in ('employee', 'employer'):
+            self._assets.contents['401k'].credits_and_debits.remove_object(
+                f'{label}_{contrib}_contribs', verbose=False
+            )
 
     @property
     def net_cashflows(self) -> pd.Series:
@@ -103,21 +196,36 @@ class Portfolio():
         net = pd.concat([inflows, outflows], axis=1).fillna(0).sum(axis=1)
         return pd.Series(net, name='net_cashflows')
 
+    def _cash_savings_inputs_key(self) -> tuple:
+        "Cache keys of everything update_cash_savings reads from."
+        return (self.income_streams._cache_key(), self.expenses._cache_key())
+
+    def _sync_cash_savings(self) -> None:
+        "Re-derive cash savings flows only if salary/expenses changed since."
+        key = self._cash_savings_inputs_key()
+        if key != self._cash_savings_synced_key:
+            self.update_cash_savings()
+            self._cash_savings_synced_key = key
+
+    @profiling.stage()
     def update_cash_savings(self) -> None:
         # TO DO: Think through this, I'm overwriting stuff every time I call this which seems wrong
-        cs = self.assets.contents['cash_savings']
+        cs = self._assets.contents['cash_savings']
         inflows = self.income_streams.contents['salary'].take_home_salary
         cs.add_contribution(Contribution('cash_inflows', date_range=inflows.index, values=inflows.values),
                             if_exists='overwrite')
         outflows = Expenses(self.expenses.post_tax)
         total_outflows = outflows.get_total_as_cashflow(freq='D', name='cash_outflows')
-        if outflows.contents:
+        if total_outflows is not None:
             cs.add_debit(total_outflows, if_exists='overwrite')
+        else: # e.g. the last post-tax expense was removed
+            cs.credits_and_debits.remove_object('cash_outflows', verbose=False)
 
     @property
+    @profiling.stage()
     def cash_savings(self) -> pd.Series:
-        self.update_cash_savings()
-        cs = self.assets.contents['cash_savings']
+        self._sync_cash_savings()
+        cs = self._assets.contents['cash_savings']
         return cs.value_through_time
 
     @property
@@ -0,0 +1,198 @@
+"""
+Opt-in per-stage profiling of portfolio evaluation. Hot functions across
+gameplan are wrapped w/ @stage; while a Profiler is active, each stage
+records its call count, cumulative & self time, and net bytes allocated
+(via tracemalloc), keyed by its call path so nested stages attribute time
+to their callers. Inactive, a stage costs one global lookup per call.
+
+    with profiling.profile() as prof:
+        port.cash_savings
+    prof.stats()                        # DataFrame, one row per stage
+    prof.write_folded('cs.folded')      # flamegraph.pl / speedscope input
+    prof.write_json('cs.json')
+
+Or set GAMEPLAN_PROFILE for the whole process: to 1 to print stats at exit,
+or to a path ending in .json (or anything else, for folded stacks) to
+write the report there.
+"""
+import atexit
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+ENV_VAR = 'GAMEPLAN_PROFILE'
+
+
+class Profiler():
+    """
+    Accumulates stage timings per call path (a tuple of stage names, the
+    outermost first). Safe to share across threads; each thread keeps its
+    own stack of open stages.
+    """
+    def __init__(self, memory: bool = True) -> None:
+        self.memory = memory
+        self._records: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+
+    def start(self) -> None:
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self) -> None:
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def call(self, name: str, fn: Callable, args, kwargs):
+        stack = self._stack()
+        # [name, child time] per open stage
+        stack.append([name, 0.0])
+        path = tuple(x[0] for x in stack)
+        mem_before = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        t = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - t
+            n_bytes = (tracemalloc.get_traced_memory()[0] - mem_before
+                       if self.memory else 0)
+            _, child_time = stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            with self._lock:
+                record = self._records.setdefault(path, [0, 0.0, 0.0, 0])
+                record[0] += 1
+                record[1] += elapsed
+                record[2] += elapsed - child_time
+                record[3] += n_bytes
+
+    def records(self) -> Dict[Tuple[str, ...], Dict[str, float]]:
+        "Per call path: calls, total_s (inclusive), self_s & net_bytes."
+        with self._lock:
+            return {
+                path: dict(calls=calls, total_s=total, self_s=self_s,
+                           net_bytes=n_bytes)
+                for path, (calls, total, self_s, n_bytes) in self._records.items()
+            }
+
+    def stats(self) -> pd.DataFrame:
+        """
+        One row per stage, summed over its call paths, by self time. total_s
+        only counts a stage's outermost calls, so recursion isn't doubled.
+        """
+        rows = {}
+        for path, record in self.records().items():
+            row = rows.setdefault(path[-1], dict(calls=0, total_s=0.0,
+                                                 self_s=0.0, net_bytes=0))
+            row['calls'] += record['calls']
+            row['self_s'] += record['self_s']
+            row['net_bytes'] += record['net_bytes']
+            if path[-1] not in path[:-1]:
+                row['total_s'] += record['total_s']
+        df = pd.DataFrame.from_dict(
+            rows, orient='index',
+            columns=['calls', 'total_s', 'self_s', 'net_bytes']
+        )
+        df.index.name = 'stage'
+        return df.sort_values('self_s', ascending=False)
+
+    def to_dict(self) -> dict:
+        return dict(
+            stages=self.stats().reset_index().to_dict(orient='records'),
+            paths=[dict(path=list(path), **record)
+                   for path, record in self.records().items()],
+        )
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_folded(self, path: str) -> None:
+        "Folded stacks ('a;b;c <self microseconds>' per line) for flame graphs."
+        with open(path, 'w') as f:
+            for stack, record in sorted(self.records().items()):
+                f.write(f"{';'.join(stack)} {round(record['self_s'] * 1e6)}\n")
+
+    def write(self, path: str) -> None:
+        "write_json for *.json paths, write_folded otherwise."
+        if path.endswith('.json'):
+            self.write_json(path)
+        else:
+            self.write_folded(path)
+
+
+_ACTIVE: Optional[Profiler] = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    "The active Profiler, or None if profiling is off."
+    return _ACTIVE
+
+
+@contextmanager
+def profile(memory: bool = True) -> Iterator[Profiler]:
+    "Profile stages run inside the block (replacing any active Profiler)."
+    global _ACTIVE
+    previous, profiler = _ACTIVE, Profiler(memory)
+    profiler.start()
+    _ACTIVE = profiler
+    try:
+        yield profiler
+    finally:
+        _ACTIVE = previous
+        profiler.stop()
+
+
+def stage(name: Optional[str] = None) -> Callable:
+    """
+    Record calls to the decorated function as a stage, named name or
+    module.qualname. Put it under @property & over any caching decorator's
+    inner function to only count real work.
+    """
+    def decorator(fn: Callable) -> Callable:
+        stage_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _ACTIVE
+            if profiler is None:
+                return fn(*args, **kwargs)
+            return profiler.call(stage_name, fn, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _install_from_env() -> None:
+    global _ACTIVE
+    target = os.environ.get(ENV_VAR)
+    if not target or target == '0':
+        return
+    profiler = Profiler(memory=True)
+    profiler.start()
+    _ACTIVE = profiler
+
+    def report() -> None:
+        if target == '1':
+            print(profiler.stats().to_string(), file=sys.stderr)
+        else:
+            profiler.write(target)
+    atexit.register(report)
+
+
+_install_from_env()
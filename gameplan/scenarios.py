@@ -0,0 +1,136 @@
+"""
+Parameter sweeps over Portfolios, e.g. what-ifs on retirement age, 401k %
+or rent, evaluated across CPU cores.
+
+A sweep calls build_fn(**shared, **params) for every point of a parameter
+grid and reduces each Portfolio to a row of metrics. Each worker process
+gets build_fn, metrics & shared once, when it starts, along with the
+parent's simulated asset return paths & fitted growth curves (see
+get_shared_state), so scenarios only ship their (small) params.
+build_fn & metrics must be picklable, i.e. module-level functions.
+"""
+from itertools import product
+import multiprocessing
+import os
+import pandas as pd
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+from gameplan.growth.asset_returns import get_asset_returns
+from gameplan.growth.growth_series import FIT_CACHE
+
+ParamGrid = Union[Dict[str, list], List[dict]]
+
+
+def final_cash_savings(portfolio) -> float:
+    return portfolio.cash_savings.iloc[-1]
+
+
+def min_cash_savings(portfolio) -> float:
+    return portfolio.cash_savings.min()
+
+
+def final_401k_balance(portfolio) -> float:
+    return portfolio.assets.contents['401k'].value_through_time.iloc[-1]
+
+
+DEFAULT_METRICS = {
+    'final_cash_savings': final_cash_savings,
+    'min_cash_savings': min_cash_savings,
+}
+
+
+def expand_grid(param_grid: ParamGrid) -> List[dict]:
+    "A dict of {param: values} -> every combination; a list of dicts as is."
+    if isinstance(param_grid, dict):
+        names = list(param_grid)
+        return [dict(zip(names, values))
+                for values in product(*(param_grid[x] for x in names))]
+    return [dict(x) for x in param_grid]
+
+
+def get_shared_state() -> dict:
+    "Process-wide caches worth handing to sweep workers."
+    return dict(asset_returns=get_asset_returns(), fit_cache=FIT_CACHE.export())
+
+
+def install_shared_state(asset_returns=None, fit_cache=None) -> None:
+    "Seed this process' caches from get_shared_state() of another."
+    if asset_returns is not None:
+        local = get_asset_returns()
+        for asset_type in ('equity', 'fixed_income', 'cash_savings'):
+            for ticker, series in getattr(asset_returns, asset_type).items():
+                getattr(local, asset_type).setdefault(ticker, series)
+    if fit_cache:
+        FIT_CACHE.load(fit_cache)
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(build_fn, metrics, shared, shared_state) -> None:
+    install_shared_state(**shared_state)
+    _WORKER_STATE.update(build_fn=build_fn, metrics=metrics, shared=shared)
+
+
+def _evaluate_in_worker(task) -> dict:
+    scenario, params = task
+    return _evaluate(scenario, params, **_WORKER_STATE)
+
+
+def _evaluate(scenario, params, build_fn, metrics, shared) -> dict:
+    portfolio = build_fn(**shared, **params)
+    row = dict(scenario=scenario, **params)
+    row.update({name: fn(portfolio) for name, fn in metrics.items()})
+    return row
+
+
+def iter_sweep(build_fn: Callable,
+               param_grid: ParamGrid,
+               metrics: Optional[Dict[str, Callable]] = None,
+               shared: Optional[dict] = None,
+               n_workers: Optional[int] = None,
+               chunksize: Optional[int] = None,
+               share_caches: bool = True
+               ) -> Iterator[dict]:
+    """
+    Yield a row per scenario (scenario #, params & metrics) as each one
+    finishes, in completion order. n_workers=1 runs in this process.
+    """
+    scenarios = expand_grid(param_grid)
+    metrics = metrics if metrics is not None else DEFAULT_METRICS
+    shared = shared if shared is not None else {}
+    n_workers = min(n_workers or os.cpu_count() or 1, len(scenarios))
+    if n_workers <= 1:
+        for scenario, params in enumerate(scenarios):
+            yield _evaluate(scenario, params, build_fn, metrics, shared)
+        return
+
+    shared_state = get_shared_state() if share_caches else {}
+    # a few chunks per worker balances load w/o a round trip per scenario
+    chunksize = chunksize or max(1, len(scenarios) // (4 * n_workers))
+    with multiprocessing.Pool(
+        n_workers,
+        initializer=_init_worker,
+        initargs=(build_fn, metrics, shared, shared_state)
+    ) as pool:
+        yield from pool.imap_unordered(_evaluate_in_worker,
+                                       enumerate(scenarios),
+                                       chunksize=chunksize)
+
+
+def sweep(build_fn: Callable,
+          param_grid: ParamGrid,
+          metrics: Optional[Dict[str, Callable]] = None,
+          shared: Optional[dict] = None,
+          n_workers: Optional[int] = None,
+          chunksize: Optional[int] = None,
+          share_caches: bool = True
+          ) -> pd.DataFrame:
+    "iter_sweep, collected into a table w/ a row per scenario, in grid order."
+    rows = list(iter_sweep(build_fn, param_grid, metrics, shared, n_workers,
+                           chunksize, share_caches))
+    if not rows: # an empty grid -> an empty table w/ the same columns
+        names = list(param_grid) if isinstance(param_grid, dict) else []
+        metrics = metrics if metrics is not None else DEFAULT_METRICS
+        return pd.DataFrame(columns=['scenario', *names, *metrics]).set_index('scenario')
+    return pd.DataFrame(rows).sort_values('scenario').set_index('scenario')
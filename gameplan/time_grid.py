@@ -0,0 +1,147 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import gameplan.helpers as hp
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+
+
+def to_epoch_days(index: pd.DatetimeIndex) -> np.ndarray:
+    "int64 days since 1970-01-01 for each date in index."
+    return pd.DatetimeIndex(index).asi8 // NS_PER_DAY
+
+
+def from_epoch_days(days: np.ndarray) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(np.asarray(days, dtype=np.int64) * NS_PER_DAY)
+
+
+def get_bucket_indices(date_index: pd.DatetimeIndex, freq
+                       ) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+    """
+    (bin labels, bin of each date) for resampling a sorted date_index to
+    freq, matching pd.DataFrame.resample(freq) binning.
+    """
+    counts = (
+        pd.Series(np.ones(len(date_index)), index=date_index)
+        .resample(freq)
+        .count()
+    )
+    buckets = np.repeat(np.arange(len(counts)), counts.values)
+    return counts.index, buckets
+
+
+class TimeGrid():
+    """
+    Immutable, precomputed date grid shared by CashFlows & GrowthSeries:
+        * date_range - the pd.DatetimeIndex, built once
+        * day_offsets - int64 days from the first date, read-only
+    Grids are interchangeable across objects, see get_time_grid.
+    """
+    __slots__ = ('start_dt', 'end_dt', 'freq', 'date_range', 'day_offsets')
+
+    def __init__(self, date_range: pd.DatetimeIndex) -> None:
+        asi8 = date_range.asi8
+        day_offsets = (
+            (asi8 - asi8.min()) // NS_PER_DAY if len(asi8)
+            else np.array([], dtype=np.int64)
+        )
+        day_offsets.setflags(write=False)
+        set_attr = super().__setattr__
+        set_attr('start_dt', date_range.min())
+        set_attr('end_dt', date_range.max())
+        set_attr('freq', date_range.freq)
+        set_attr('date_range', date_range)
+        set_attr('day_offsets', day_offsets)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __len__(self) -> int:
+        return len(self.day_offsets)
+
+    @property
+    def epoch_days(self) -> np.ndarray:
+        return to_epoch_days(self.date_range)
+
+    @classmethod
+    def from_bounds(cls, start_dt, end_dt, freq) -> 'TimeGrid':
+        return get_time_grid(start_dt, end_dt, freq)
+
+
+@lru_cache(maxsize=512)
+def get_time_grid(start_dt, end_dt, freq) -> TimeGrid:
+    """
+    The (shared) TimeGrid for pd.date_range(start_dt, end_dt, freq), with
+    freq aliases resolved through hp.FREQ_MAP & dates normalized.
+    """
+    date_range = pd.date_range(
+        start=start_dt,
+        end=end_dt,
+        freq=hp.FREQ_MAP.get(freq, freq),
+        normalize=True
+    )
+    return TimeGrid(date_range)
+
+
+class AlignedCashFlows():
+    """
+    Columns of cash flows from many members, laid out once on their common
+    integer day grid (the sorted union of every member's dates):
+        * matrix - (n_days, n_columns), accumulated w/ np.add.at, so
+          members are aligned in one pass rather than outer-joined
+        * totals - matrix summed across columns
+    Periodic aggregates reuse cached per-freq bucket indices, see aggregate.
+    """
+    def __init__(self,
+                 members: Sequence[Tuple[np.ndarray, List[str], np.ndarray]]
+                 ) -> None:
+        """
+        members: (epoch days, column names, (n_dates, n_cols) values) per
+        member, e.g. from CashFlow._as_columns. Missing values count as 0.
+        """
+        self.columns = [c for _, cols, _ in members for c in cols]
+        self.days = np.unique(np.concatenate(
+            [np.asarray(days, dtype=np.int64) for days, _, _ in members]
+        ))
+        self.matrix = np.zeros((len(self.days), len(self.columns)))
+        col = 0
+        for days, cols, values in members:
+            values = np.asarray(values, dtype=float).reshape(len(days), len(cols))
+            rows = np.searchsorted(self.days, days)
+            col_idx = np.arange(col, col + len(cols))
+            np.add.at(
+                self.matrix,
+                (rows[:, None], col_idx[None, :]),
+                np.where(np.isnan(values), 0.0, values)
+            )
+            col += len(cols)
+        self.totals = self.matrix.sum(axis=1)
+        self._buckets: Dict[object, Tuple[pd.DatetimeIndex, np.ndarray]] = {}
+
+    @property
+    def date_index(self) -> pd.DatetimeIndex:
+        return from_epoch_days(self.days)
+
+    def bucket_indices(self, freq) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        """
+        get_bucket_indices for self.date_index, computed once per freq.
+        """
+        if freq not in self._buckets:
+            self._buckets[freq] = get_bucket_indices(self.date_index, freq)
+        return self._buckets[freq]
+
+    def aggregate(self, freq, values: Optional[np.ndarray] = None
+                  ) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        "Sum values (default: matrix) along the day axis into freq bins."
+        values = self.matrix if values is None else values
+        labels, buckets = self.bucket_indices(freq)
+        out = np.zeros((len(labels),) + values.shape[1:])
+        np.add.at(out, buckets, values)
+        return labels, out
+
+    def to_df(self, totals_col_label: str) -> pd.DataFrame:
+        df = pd.DataFrame(self.matrix, index=self.date_index, columns=self.columns)
+        df[totals_col_label] = self.totals
+        return df